@@ -1,56 +1,235 @@
-from typing import List, Dict, Tuple
+import math
+import os
+from typing import Dict, Tuple, NamedTuple, Sequence, Union, List, Optional
 
-import matplotlib.pyplot as plt
+import matplotlib
+import numpy as np
 
-from src.request_utils import Request, State
+matplotlib.use('Agg')  # render to files only, never block on a GUI window
+import matplotlib.pyplot as plt  # noqa: E402 (the backend has to be chosen first)
 
+from src.request_utils import RequestTable, State
+from src.streaming_metrics import StreamingMetrics, LATENCY_QUANTILES, histogram_counts
 
-def success_percent(all_requests: List[Request]) -> float:
+
+class ReplicatedSummary(NamedTuple):
+    """Mean and confidence interval half width of the metrics over independent replications of a simulation."""
+    replications: int
+    success_percent: float
+    success_percent_half_width: float
+    latency: float
+    latency_half_width: float
+
+
+SimulationResult = Union[RequestTable, StreamingMetrics, ReplicatedSummary]
+
+
+def success_percent(all_requests: Union[RequestTable, StreamingMetrics]) -> float:
     """Calculate the success percent of requests."""
     total_requests = len(all_requests)
     if total_requests == 0:
         return 0
-    successful_requests = sum(1 for req in all_requests if req.finish_state == State.FINISHED_SUCCESSFULLY)
+    successful_requests = all_requests.state_counts()[State.FINISHED_SUCCESSFULLY]
     return successful_requests / total_requests * 100
 
 
+def result_success_percent(result: SimulationResult) -> float:
+    """Success percent of a single run, or the mean over the replications."""
+    if isinstance(result, ReplicatedSummary):
+        return result.success_percent
+    return success_percent(result)
+
+
+def wait_times(all_requests: RequestTable) -> np.ndarray:
+    """Time from arrival to the start of processing, of the requests which got to the server."""
+    count = len(all_requests)
+    waits = all_requests.start_processing_time[:count] - all_requests.arrival_time[:count]
+    return waits[~np.isnan(waits)]
+
+
+def response_times(all_requests: RequestTable) -> np.ndarray:
+    """Time from arrival to the end of processing, of the processed requests."""
+    count = len(all_requests)
+    responses = all_requests.end_processing_time[:count] - all_requests.arrival_time[:count]
+    return responses[~np.isnan(responses)]
+
+
+def mean_latency(all_requests: Union[RequestTable, StreamingMetrics]) -> float:
+    """Calculate the mean response time (arrival to end of processing) of the processed requests."""
+    if isinstance(all_requests, StreamingMetrics):
+        return all_requests.mean_latency()
+    responses = response_times(all_requests)
+    return float(responses.mean()) if len(responses) else math.nan
+
+
+def _quantiles(values: np.ndarray) -> Dict[float, float]:
+    if len(values) == 0:
+        return {quantile: math.nan for quantile in LATENCY_QUANTILES}
+    return dict(zip(LATENCY_QUANTILES, np.quantile(values, LATENCY_QUANTILES).tolist()))
+
+
+def wait_time_quantiles(all_requests: Union[RequestTable, StreamingMetrics]) -> Dict[float, float]:
+    """The p50 / p95 / p99 / p99.9 of the wait times."""
+    if isinstance(all_requests, StreamingMetrics):
+        return all_requests.wait_time_quantiles()
+    return _quantiles(wait_times(all_requests))
+
+
+def response_time_quantiles(all_requests: Union[RequestTable, StreamingMetrics]) -> Dict[float, float]:
+    """The p50 / p95 / p99 / p99.9 of the response times."""
+    if isinstance(all_requests, StreamingMetrics):
+        return all_requests.quantiles()
+    return _quantiles(response_times(all_requests))
+
+
+def latency_histogram(all_requests: Union[RequestTable, StreamingMetrics]) -> np.ndarray:
+    """Number of the response times in each of the log spaced LATENCY_BIN_EDGES bins."""
+    if isinstance(all_requests, StreamingMetrics):
+        return all_requests.latency_histogram()
+    return histogram_counts(response_times(all_requests))
+
+
+def state_breakdown(all_requests: Union[RequestTable, StreamingMetrics]) -> Dict[State, float]:
+    """Percent of the requests at each State, the drop reasons among them."""
+    total_requests = len(all_requests)
+    counts = all_requests.state_counts()
+    return {state: counts[state] / total_requests * 100 if total_requests else 0 for state in State}
+
+
+def utilization(all_requests: Union[RequestTable, StreamingMetrics]) -> float:
+    """Fraction of the simulation time the workers were busy."""
+    stats = all_requests.stats
+    return stats.busy_time / (stats.simulation_time * stats.servers) if stats else math.nan
+
+
+def mean_queue_length(all_requests: Union[RequestTable, StreamingMetrics]) -> float:
+    """Time weighted average number of requests waiting in the queue."""
+    stats = all_requests.stats
+    return stats.queue_length_area / stats.simulation_time if stats else math.nan
+
+
+def _t_distribution_central_probability(t: float, df: int) -> float:
+    # P(|T| < t) for Student's t with integer degrees of freedom (Abramowitz & Stegun 26.7.3, 26.7.4)
+    theta = math.atan(t / math.sqrt(df))
+    cos_squared = math.cos(theta) ** 2
+    if df % 2:
+        term, total = 1, 1 if df > 1 else 0
+        for k in range(3, df - 1, 2):
+            term *= (k - 1) / k * cos_squared
+            total += term
+        return 2 / math.pi * (theta + math.sin(theta) * math.cos(theta) * total)
+    term, total = 1, 1
+    for k in range(2, df - 1, 2):
+        term *= (k - 1) / k * cos_squared
+        total += term
+    return math.sin(theta) * total
+
+
+def t_critical(confidence: float, df: int) -> float:
+    """Two-sided critical value of Student's t distribution, found by bisection."""
+    low, high = 0, 1
+    while _t_distribution_central_probability(high, df) < confidence:
+        low, high = high, high * 2
+    for _ in range(100):
+        middle = (low + high) / 2
+        if _t_distribution_central_probability(middle, df) < confidence:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def mean_confidence_interval(values: Sequence[float], confidence: float = 0.95) -> Tuple[float, float]:
+    """Mean of the values and the half width of its confidence interval (inf for less than 2 values)."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return math.nan, math.inf
+    if len(values) == 1:
+        return float(values[0]), math.inf
+    standard_error = values.std(ddof=1) / math.sqrt(len(values))
+    return float(values.mean()), t_critical(confidence, len(values) - 1) * float(standard_error)
+
+
+def summarize(result: SimulationResult) -> Dict[str, float]:
+    """The metrics of a single simulation (or its replications), as a row of the summary table."""
+    if isinstance(result, ReplicatedSummary):
+        return result._asdict()
+    row = {
+        'replications': 1,
+        'success_percent': success_percent(result),
+        'success_percent_half_width': math.nan,
+        'latency': mean_latency(result),
+        'latency_half_width': math.nan,
+        'utilization': utilization(result),
+        'mean_queue_length': mean_queue_length(result),
+    }
+    for quantile, value in wait_time_quantiles(result).items():
+        row[f'wait_p{quantile * 100:g}'] = value
+    for quantile, value in response_time_quantiles(result).items():
+        row[f'response_p{quantile * 100:g}'] = value
+    for state, percent in state_breakdown(result).items():
+        row[f'{state.name.lower()}_percent'] = percent
+    return row
+
+
+def _save_figure(figure, output_dir: str, name: str, formats: Sequence[str]) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    for file_format in formats:
+        figure.savefig(os.path.join(output_dir, f'{name}.{file_format}'))
+    plt.close(figure)
+
+
+def _figure_name(queue_mechanism: str, time_quantum: Optional[int], plot: str) -> str:
+    rr_name = f'_tq{time_quantum}' if time_quantum else ''
+    return f"{queue_mechanism.lower().replace(' ', '_')}{rr_name}_{plot}"
+
+
+def _success_percents(simulations: Dict[Tuple[float, int], SimulationResult]) -> Tuple[List[float], List[float]]:
+    # success percents and their confidence interval half widths (0 for single runs)
+    percents = [result_success_percent(result) for result in simulations.values()]
+    half_widths = [
+        result.success_percent_half_width if isinstance(result, ReplicatedSummary) else 0
+        for result in simulations.values()
+    ]
+    return percents, half_widths
+
+
 def plot_success_percent(
-        simulations: Dict[Tuple[float, int], List[Request]],
+        simulations: Dict[Tuple[float, int], SimulationResult],
         queue_mechanism: str,
-        time_quantum: int = None
+        time_quantum: int = None,
+        output_dir: str = 'reports',
+        formats: Sequence[str] = ('png',)
 ) -> None:
     """Plot the success percent for varying parameters."""
-    x_labels, percents = [], []
-    for (arrival_rate, queue_size), requests in simulations.items():
-        percent = success_percent(requests)
-        x_labels.append(f"AR: {arrival_rate}, QS: {queue_size}")
-        percents.append(percent)
+    x_labels = [f"AR: {arrival_rate}, QS: {queue_size}" for arrival_rate, queue_size in simulations]
+    percents, half_widths = _success_percents(simulations)
 
     rr_title = f'TQ={time_quantum}' if time_quantum else ''
 
-    plt.figure(figsize=(8, 6))
-    plt.bar(x_labels, percents)
+    fig = plt.figure(figsize=(8, 6))
+    plt.bar(x_labels, percents, yerr=half_widths if any(half_widths) else None, capsize=3)
     plt.ylim(0, 100)
     plt.title(f'Success Percent for {queue_mechanism} {rr_title}')
     plt.xlabel('Parameters (Arrival Rate, Queue Size)')
     plt.ylabel('Success Percent')
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
-    plt.show()
+    _save_figure(fig, output_dir, _figure_name(queue_mechanism, time_quantum, 'success_percent'), formats)
 
 
 def plot_success_percent_3d(
-        simulations: Dict[Tuple[float, int], List[Request]],
+        simulations: Dict[Tuple[float, int], SimulationResult],
         queue_mechanism: str,
-        time_quantum: int = None
+        time_quantum: int = None,
+        output_dir: str = 'reports',
+        formats: Sequence[str] = ('png',)
 ):
     """Plot the success percent for varying parameters in 3D."""
-    arrival_rates, queue_sizes, success_percents = [], [], []
-
-    for (arrival_rate, queue_size), requests in simulations.items():
-        arrival_rates.append(arrival_rate)
-        queue_sizes.append(queue_size)
-        success_percents.append(success_percent(requests))
+    arrival_rates = [arrival_rate for arrival_rate, _ in simulations]
+    queue_sizes = [queue_size for _, queue_size in simulations]
+    success_percents, _ = _success_percents(simulations)
 
     fig = plt.figure(figsize=(8, 6))
     ax = fig.add_subplot(111, projection='3d')
@@ -74,26 +253,54 @@ def plot_success_percent_3d(
     ax.set_zlabel('Success Percent')
     ax.set_title(f'Success Percent for {queue_mechanism} {rr_title}')
 
-    plt.show()
+    _save_figure(fig, output_dir, _figure_name(queue_mechanism, time_quantum, 'success_percent_3d'), formats)
 
 
-def analyze_simulations(simulations: Dict[Tuple[float, int], List[Request]], queue_mechanism: str):
+def plot_capacity_frontier(
+        frontiers: Dict[str, List[Tuple[int, float]]],
+        target: float,
+        output_dir: str = 'reports',
+        formats: Sequence[str] = ('png',)
+) -> None:
+    """Plot the highest arrival rate meeting the target success percent by the queue size, a line per mechanism."""
+    fig = plt.figure(figsize=(8, 6))
+    for label, points in frontiers.items():
+        queue_sizes, arrival_rates = zip(*sorted(points))
+        plt.plot(queue_sizes, arrival_rates, marker='o', label=label)
+    plt.xscale('log')
+    plt.yscale('log')
+    plt.title(f'Capacity Frontier ({target:g}% Success)')
+    plt.xlabel('Queue Size')
+    plt.ylabel('Max Arrival Rate')
+    plt.legend()
+    plt.tight_layout()
+    _save_figure(fig, output_dir, 'capacity_frontier', formats)
+
+
+def analyze_simulations(
+        simulations: Dict[Tuple[float, int], SimulationResult],
+        queue_mechanism: str,
+        output_dir: str = 'reports',
+        formats: Sequence[str] = ('png',)
+):
     """Perform a full analysis of the simulations."""
     # Plot success percent
-    plot_success_percent(simulations, queue_mechanism)
+    plot_success_percent(simulations, queue_mechanism, output_dir=output_dir, formats=formats)
 
     # Plot success percent in 3D
-    plot_success_percent_3d(simulations, queue_mechanism)
+    plot_success_percent_3d(simulations, queue_mechanism, output_dir=output_dir, formats=formats)
 
 
 def analyze_simulations_rr(
-        simulations: Dict[Tuple[float, int], List[Request]],
+        simulations: Dict[Tuple[float, int], SimulationResult],
         time_quantum: int,
-        queue_mechanism: str
+        queue_mechanism: str,
+        output_dir: str = 'reports',
+        formats: Sequence[str] = ('png',)
 ):
     """Perform a full analysis of the simulations."""
     # Plot success percent
-    plot_success_percent(simulations, queue_mechanism, time_quantum)
+    plot_success_percent(simulations, queue_mechanism, time_quantum, output_dir, formats)
 
     # Plot success percent in 3D
-    plot_success_percent_3d(simulations, queue_mechanism, time_quantum)
+    plot_success_percent_3d(simulations, queue_mechanism, time_quantum, output_dir, formats)
@@ -0,0 +1,162 @@
+"""
+Throughput and memory benchmarks of the simulators, at the traffic regimes of consts.py.
+
+Every case (queue mechanism, regime, backend) runs in a fresh process, so its peak RSS isn't inflated by the
+previous cases. The results are saved as JSON, and compared against a baseline JSON of an earlier run:
+a case regresses when its throughput dropped, or its memory grew, by more than the threshold.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+from src.consts import SIMULATION_TIME, TIME_QUANTUMS
+from src.simulators.kernels import BACKENDS
+from src.sweep import SIMULATORS, QUANTUM_MECHANISMS, KERNEL_MECHANISMS, Cell
+
+# (arrival rate per millisecond, queue size) in the middle of each regime of consts.py
+REGIMES = {
+    'Low': (0.01, 100),
+    'Medium': (0.1, 1000),
+    'High': (1, 10000),
+    'Extreme': (2, 20000),
+}
+BENCHMARK_SEED = 0
+# the measures which are worse when higher, the rest are worse when lower
+_LOWER_IS_BETTER = ('wall_time', 'wall_time_per_simulated_second', 'peak_rss_mb', 'tracemalloc_peak_mb')
+
+
+class Case(NamedTuple):
+    queue_mechanism: str
+    regime: str
+    backend: str = 'python'
+    streaming: bool = False
+
+    @property
+    def name(self) -> str:
+        return '/'.join([self.queue_mechanism, self.regime, self.backend] + ['streaming'] * self.streaming)
+
+    def cell(self) -> Cell:
+        arrival_rate, max_queue_size = REGIMES[self.regime]
+        # the median quantum of the sweep
+        time_quantum = sorted(TIME_QUANTUMS)[len(TIME_QUANTUMS) // 2] \
+            if self.queue_mechanism in QUANTUM_MECHANISMS else None
+        return Cell(self.queue_mechanism, arrival_rate, max_queue_size, time_quantum)
+
+
+def _peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 2 ** 20 if sys.platform == 'darwin' else peak_rss / 2 ** 10  # bytes on macOS, KB on Linux
+
+
+def _measure(case: Case, simulation_time: float, repeat: int) -> Dict[str, float]:
+    """Runs in the case's own process."""
+    cell = case.cell()
+    simulate = SIMULATORS[cell.queue_mechanism].simulate
+    arguments = (cell.max_queue_size, cell.arrival_rate) + ((cell.time_quantum,) if cell.time_quantum else ())
+    options = {'seed': BENCHMARK_SEED, 'streaming': case.streaming}
+    if case.backend != 'python':
+        options['backend'] = case.backend
+    simulate(*arguments, simulation_time=min(simulation_time, 100), **options)  # warm up (and JIT compile)
+
+    wall_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = simulate(*arguments, simulation_time=simulation_time, **options)
+        wall_times.append(time.perf_counter() - start)
+    wall_time = statistics.median(wall_times)
+
+    # tracing slows the run down, so the memory is measured on a separate run
+    tracemalloc.start()
+    simulate(*arguments, simulation_time=simulation_time, **options)
+    _, tracemalloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'requests': len(result),
+        'wall_time': wall_time,
+        'requests_per_second': len(result) / wall_time,
+        'wall_time_per_simulated_second': wall_time / (simulation_time / 1000),
+        'peak_rss_mb': _peak_rss_mb(),
+        'tracemalloc_peak_mb': tracemalloc_peak / 2 ** 20,
+    }
+
+
+def run_benchmarks(cases: List[Case], simulation_time: float = SIMULATION_TIME, repeat: int = 3) -> Dict:
+    results = {}
+    for case in cases:
+        # a fresh (spawned, not forked) process per case, for its own peak RSS
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results[case.name] = pool.submit(_measure, case, simulation_time, repeat).result()
+        print(f"{case.name}: {results[case.name]['requests_per_second']:,.0f} requests/s", flush=True)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'simulation_time': simulation_time,
+        'repeat': repeat,
+        'cases': results,
+    }
+
+
+def find_regressions(results: Dict, baseline: Dict, threshold: float = 0.1) -> List[str]:
+    """Descriptions of the measures which got worse than the baseline by more than `threshold` (relative)."""
+    regressions = []
+    for name, measures in results['cases'].items():
+        baseline_measures = baseline['cases'].get(name)
+        if baseline_measures is None:
+            continue
+        for measure in ('requests_per_second', 'peak_rss_mb', 'tracemalloc_peak_mb'):
+            value, baseline_value = measures[measure], baseline_measures[measure]
+            change = (value - baseline_value) / baseline_value if baseline_value else 0
+            if (change if measure in _LOWER_IS_BETTER else -change) > threshold:
+                regressions.append(f'{name} {measure}: {baseline_value:,.2f} -> {value:,.2f} ({change:+.0%})')
+    return regressions
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the simulators throughput and memory')
+    parser.add_argument('--mechanisms', nargs='+', default=list(SIMULATORS), choices=list(SIMULATORS))
+    parser.add_argument('--regimes', nargs='+', default=list(REGIMES), choices=list(REGIMES))
+    parser.add_argument('--backends', nargs='+', default=['python'], choices=BACKENDS)
+    parser.add_argument('--streaming', action='store_true', help='benchmark the streaming metrics runs')
+    parser.add_argument('--simulation-time', type=float, default=SIMULATION_TIME, help='milliseconds per run')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case, the median is reported')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file of the results')
+    parser.add_argument('--baseline', help='JSON results of an earlier run, to flag the regressions against')
+    parser.add_argument(
+        '--threshold', type=float, default=0.1, help='relative slow down (or memory growth) which is a regression',
+    )
+    return parser.parse_args()
+
+
+def main() -> Optional[int]:
+    args = _parse_args()
+    cases = [
+        Case(queue_mechanism, regime, backend, args.streaming)
+        for queue_mechanism in args.mechanisms
+        for regime in args.regimes
+        for backend in args.backends
+        if backend == 'python' or queue_mechanism in KERNEL_MECHANISMS  # the others have only the Python engine
+    ]
+    results = run_benchmarks(cases, args.simulation_time, args.repeat)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    if args.baseline is None:
+        return None
+    with open(args.baseline) as file:
+        regressions = find_regressions(results, json.load(file), args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
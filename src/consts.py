@@ -23,4 +23,3 @@ TIME_QUANTUMS = [10, 25, 50, 80, 100][::-1]
 
 DEADLINE = 2000  # milliseconds == 2 secs
 SIMULATION_TIME = 10000  # milliseconds == 10 secs
-IDLE_TIME = 0.001  # milliseconds
@@ -0,0 +1,308 @@
+"""
+Distributed execution of a sweep, by workers on any number of hosts which share a task broker.
+
+The coordinator splits the grid into work units - a cell with its seed - and submits them with the `run` function.
+A worker claims a unit under a lease, runs it and writes its result back. The lease is renewed while the unit runs,
+so a unit of a crashed (or partitioned) worker is claimed again once the lease expires, and a unit which raised
+(or whose lease expired) is retried up to `max_attempts` times. Unit ids are a hash of their content and the first
+result of a unit is kept, so resubmitting a sweep or running a unit twice is harmless. The content includes a digest
+of the `run` function (with its settings) and of the simulation code, so a sweep with other settings doesn't get
+the results of an earlier one.
+The default broker is a SQLite file (on a shared file system for several hosts), other brokers register by scheme.
+A broker holds a single sweep at a time - the coordinator waits for all of its units.
+"""
+import collections
+import hashlib
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Type
+
+from tqdm import tqdm
+
+from src.analyzer import SimulationResult
+from src.result_cache import code_version
+from src.sweep import Cell, run_cell, spawn_seeds
+
+BROKERS: Dict[str, Type['Broker']] = {}
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+
+def register_broker(scheme: str) -> Callable[[Type['Broker']], Type['Broker']]:
+    def register(broker_class: Type['Broker']) -> Type['Broker']:
+        BROKERS[scheme] = broker_class
+        return broker_class
+    return register
+
+
+class WorkUnit(NamedTuple):
+    cell: Cell
+    seed: Optional[int]
+    version: str = ''  # of the run function and the simulation code, which determine the result as well
+
+    @property
+    def id(self) -> str:
+        return hashlib.sha256(repr(tuple(self)).encode()).hexdigest()[:32]
+
+
+class Broker:
+    """The task queue the coordinator and the workers share, subclasses implement the storage."""
+
+    def submit(self, units: Sequence[WorkUnit], run: Callable[[Cell, Optional[int]], SimulationResult]) -> None:
+        """Add the units and the function which runs them, the done units are kept and the failed ones retried."""
+        raise NotImplementedError
+
+    def run_function(self) -> Callable[[Cell, Optional[int]], SimulationResult]:
+        raise NotImplementedError
+
+    def claim(self, worker: str, lease: float) -> Optional[WorkUnit]:
+        """Take a pending unit (or one whose lease expired) for `lease` seconds, None if there's none."""
+        raise NotImplementedError
+
+    def renew(self, unit_id: str, worker: str, lease: float) -> None:
+        raise NotImplementedError
+
+    def complete(self, unit_id: str, result: SimulationResult) -> None:
+        raise NotImplementedError
+
+    def fail(self, unit_id: str, worker: str, error: str) -> None:
+        """Release the unit to be retried, or mark it as failed after its last attempt."""
+        raise NotImplementedError
+
+    def states(self, unit_ids: Optional[Sequence[str]] = None) -> Dict[str, int]:
+        """Number of units in each state, of all of them or only of `unit_ids`."""
+        raise NotImplementedError
+
+    def errors(self) -> Dict[str, str]:
+        """The last error of every failed unit, by the unit id."""
+        raise NotImplementedError
+
+    def results(self, unit_ids: Sequence[str]) -> Dict[str, SimulationResult]:
+        raise NotImplementedError
+
+
+@register_broker('sqlite')
+class SqliteBroker(Broker):
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        # autocommit mode, the transactions which have to be atomic are explicit
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS units (
+                id TEXT PRIMARY KEY, unit BLOB, state TEXT, attempts INTEGER DEFAULT 0,
+                worker TEXT, lease_expiry REAL, error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS units_state ON units (state);
+            CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, result BLOB);
+            CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value BLOB);
+        ''')
+
+    def __getstate__(self) -> Dict:
+        return {'path': self.path, 'max_attempts': self.max_attempts}  # every process opens its own connection
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__init__(**state)
+
+    def submit(self, units: Sequence[WorkUnit], run: Callable[[Cell, Optional[int]], SimulationResult]) -> None:
+        with self._transaction():
+            self._connection.execute(
+                'INSERT OR REPLACE INTO settings VALUES (?, ?)', ('run', pickle.dumps(run))
+            )
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO units (id, unit, state) VALUES (?, ?, ?)',
+                [(unit.id, pickle.dumps(unit), PENDING) for unit in units],
+            )
+            self._connection.execute('UPDATE units SET state = ?, attempts = 0 WHERE state = ?', (PENDING, FAILED))
+            # the unfinished units of an earlier sweep would be run with this sweep's function, so they're dropped
+            unit_ids = {unit.id for unit in units}
+            self._connection.executemany('DELETE FROM units WHERE id = ?', [
+                (unit_id,) for unit_id, in self._connection.execute('SELECT id FROM units WHERE state != ?', (DONE,))
+                if unit_id not in unit_ids
+            ])
+
+    def run_function(self) -> Callable[[Cell, Optional[int]], SimulationResult]:
+        row = self._connection.execute("SELECT value FROM settings WHERE name = 'run'").fetchone()
+        return pickle.loads(row[0])
+
+    def claim(self, worker: str, lease: float) -> Optional[WorkUnit]:
+        now = time.time()
+        with self._transaction():
+            # a unit whose lease expired on its last attempt crashed its workers every time, it's not retried again
+            self._connection.execute(
+                'UPDATE units SET state = ?, error = ? WHERE state = ? AND lease_expiry < ? AND attempts >= ?',
+                (FAILED, f'the lease expired on all the {self.max_attempts} attempts', RUNNING, now,
+                 self.max_attempts),
+            )
+            row = self._connection.execute(
+                'SELECT id, unit FROM units WHERE state = ? OR (state = ? AND lease_expiry < ?) LIMIT 1',
+                (PENDING, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            unit_id, unit = row
+            self._connection.execute(
+                'UPDATE units SET state = ?, worker = ?, lease_expiry = ?, attempts = attempts + 1 WHERE id = ?',
+                (RUNNING, worker, now + lease, unit_id),
+            )
+        return pickle.loads(unit)
+
+    def renew(self, unit_id: str, worker: str, lease: float) -> None:
+        self._connection.execute(
+            'UPDATE units SET lease_expiry = ? WHERE id = ? AND worker = ? AND state = ?',
+            (time.time() + lease, unit_id, worker, RUNNING),
+        )
+
+    def complete(self, unit_id: str, result: SimulationResult) -> None:
+        with self._transaction():
+            # a unit which ran twice (an expired lease) keeps its first result, the runs are reproducible anyway
+            self._connection.execute('INSERT OR IGNORE INTO results VALUES (?, ?)', (unit_id, pickle.dumps(result)))
+            self._connection.execute('UPDATE units SET state = ?, error = NULL WHERE id = ?', (DONE, unit_id))
+
+    def fail(self, unit_id: str, worker: str, error: str) -> None:
+        self._connection.execute(
+            'UPDATE units SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ? '
+            'WHERE id = ? AND worker = ? AND state = ?',
+            (self.max_attempts, FAILED, PENDING, error, unit_id, worker, RUNNING),
+        )
+
+    def states(self, unit_ids: Optional[Sequence[str]] = None) -> Dict[str, int]:
+        if unit_ids is None:
+            return dict(self._connection.execute('SELECT state, COUNT(*) FROM units GROUP BY state'))
+        unit_ids = set(unit_ids)
+        return dict(collections.Counter(
+            state for unit_id, state in self._connection.execute('SELECT id, state FROM units') if unit_id in unit_ids
+        ))
+
+    def errors(self) -> Dict[str, str]:
+        return dict(self._connection.execute('SELECT id, error FROM units WHERE state = ?', (FAILED,)))
+
+    def results(self, unit_ids: Sequence[str]) -> Dict[str, SimulationResult]:
+        results = {}
+        for unit_id in unit_ids:
+            row = self._connection.execute('SELECT result FROM results WHERE id = ?', (unit_id,)).fetchone()
+            if row is not None:
+                results[unit_id] = pickle.loads(row[0])
+        return results
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._connection)
+
+
+class _ImmediateTransaction:
+    # BEGIN IMMEDIATE takes the write lock upfront, so two workers can't claim the same unit
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def __enter__(self) -> None:
+        self._connection.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, *_) -> None:
+        self._connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def open_broker(url: str) -> Broker:
+    """A broker by its URL, `scheme://location` (a plain path is a SQLite file)."""
+    scheme, separator, location = url.partition('://')
+    if not separator:
+        scheme, location = 'sqlite', url
+    return BROKERS[scheme](location)
+
+
+def work(broker: Broker, lease: float = 60, poll_interval: float = 1, wait: bool = False) -> int:
+    """Run units until there are none left (or forever, if `wait`), returns how many units were done."""
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    run = None
+    done = 0
+    while True:
+        unit = broker.claim(worker, lease)
+        if unit is None:
+            states = broker.states()
+            if not wait and not states.get(PENDING) and not states.get(RUNNING):
+                return done
+            time.sleep(poll_interval)  # the running units may still expire and be released
+            continue
+
+        if run is None:  # only once there's a sweep
+            run = broker.run_function()
+        stop_renewing = threading.Event()
+        renewer = threading.Thread(target=_renew_lease, args=(broker, unit.id, worker, lease, stop_renewing))
+        renewer.start()
+        try:
+            result = run(unit.cell, unit.seed)
+        except Exception:  # any failure of the unit is retried, the worker goes on
+            broker.fail(unit.id, worker, traceback.format_exc())
+            continue
+        finally:
+            stop_renewing.set()
+            renewer.join()
+        broker.complete(unit.id, result)
+        done += 1
+
+
+def _renew_lease(broker: Broker, unit_id: str, worker: str, lease: float, stop: threading.Event) -> None:
+    renewing_broker = pickle.loads(pickle.dumps(broker))  # a connection of its own thread
+    while not stop.wait(lease / 3):
+        renewing_broker.renew(unit_id, worker, lease)
+
+
+def run_version(run: Callable[[Cell, Optional[int]], SimulationResult]) -> str:
+    """Digest of the run function (with its settings) and of the simulation code."""
+    return hashlib.sha256(pickle.dumps(run) + code_version().encode()).hexdigest()[:16]
+
+
+def build_units(
+        cells: Sequence[Cell],
+        seed: Optional[int] = None,
+        run: Callable[[Cell, Optional[int]], SimulationResult] = run_cell
+) -> List[WorkUnit]:
+    """A unit per cell, with the same seeds a local run_sweep gives them."""
+    version = run_version(run)
+    return [WorkUnit(cell, cell_seed, version) for cell, cell_seed in zip(cells, spawn_seeds(len(cells), seed))]
+
+
+def run_distributed_sweep(
+        broker: Broker,
+        cells: Sequence[Cell],
+        workers: int = 1,
+        seed: Optional[int] = None,
+        run: Callable[[Cell, Optional[int]], SimulationResult] = run_cell,
+        poll_interval: float = 1
+) -> Dict[Cell, SimulationResult]:
+    """
+    Submit the sweep, work on it with `workers` local processes (0 leaves it to remote workers only)
+    and wait until all the units are done.
+    """
+    units = build_units(cells, seed, run)
+    unit_ids = [unit.id for unit in units]
+    broker.submit(units, run)
+    with ProcessPoolExecutor(max(workers, 1)) as pool:
+        futures = [pool.submit(work, broker, poll_interval=poll_interval) for _ in range(workers)]
+        # the progress of this sweep's units (the broker keeps the done units of earlier sweeps too)
+        with tqdm(total=len(units)) as progress:
+            while True:
+                states = broker.states(unit_ids)
+                progress.update(states.get(DONE, 0) + states.get(FAILED, 0) - progress.n)
+                if not states.get(PENDING) and not states.get(RUNNING):
+                    break
+                if not futures:
+                    time.sleep(poll_interval)
+                    continue
+                wait(futures, timeout=poll_interval)
+                for future in futures:
+                    if future.done():
+                        future.result()  # raise the errors of the local workers, if any
+        for future in futures:
+            future.result()
+
+    results = broker.results(unit_ids)
+    if len(results) < len(units):
+        errors = broker.errors()
+        unit_id, error = next(iter(errors.items()), ('', ''))
+        raise RuntimeError(f'{len(units) - len(results)} work units failed, the last error of {unit_id}:\n{error}')
+    return {unit.cell: results[unit.id] for unit in units}
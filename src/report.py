@@ -0,0 +1,144 @@
+"""
+Non-interactive reporting of a sweep: the figures of every queue mechanism (and time quantum) are written
+to an output directory, along with a single summary table of all the cells and their latency histograms.
+"""
+import csv
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.analyzer import (
+    ReplicatedSummary, SimulationResult, analyze_simulations, analyze_simulations_rr, latency_histogram,
+    plot_capacity_frontier, summarize,
+)
+from src.search import Frontier
+from src.streaming_metrics import LATENCY_BIN_EDGES
+from src.sweep import Cell
+
+SUMMARY_FILE_NAME = 'summary.csv'
+FRONTIER_FILE_NAME = 'capacity_frontier.csv'
+HISTOGRAM_FILE_NAME = 'latency_histograms.csv'
+
+
+def select(
+        results: Dict[Cell, SimulationResult],
+        queue_mechanism: str,
+        time_quantum: Optional[int] = None,
+        servers: int = 1,
+        cache_capacity: Optional[int] = None
+) -> Dict[Tuple[float, int], SimulationResult]:
+    group = (queue_mechanism, time_quantum, servers, cache_capacity)
+    return {
+        (cell.arrival_rate, cell.max_queue_size): result
+        for cell, result in results.items()
+        if (cell.queue_mechanism, cell.time_quantum, cell.servers, cell.cache_capacity) == group
+    }
+
+
+def _label(queue_mechanism: str, servers: int, cache_capacity: Optional[int]) -> str:
+    label = queue_mechanism
+    if servers > 1:
+        label += f' {servers} workers'
+    if cache_capacity is not None:
+        label += f' cache {cache_capacity}'
+    return label
+
+
+def write_summary(results: Dict[Cell, SimulationResult], path: str) -> None:
+    """Write a CSV row of metrics for every cell."""
+    with open(path, 'w', newline='') as file:
+        writer = None
+        for cell, result in results.items():
+            row = {**cell._asdict(), **summarize(result)}
+            if writer is None:
+                writer = csv.DictWriter(file, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def write_latency_histograms(results: Dict[Cell, SimulationResult], path: str) -> None:
+    """Write a CSV row of every non empty latency bin of every cell, by the bin upper edge (in milliseconds)."""
+    upper_edges = [*LATENCY_BIN_EDGES.tolist(), math.inf]
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=[*Cell._fields, 'latency_upper_edge', 'count'])
+        writer.writeheader()
+        for cell, result in results.items():
+            if isinstance(result, ReplicatedSummary):  # only the means of the replications are kept
+                continue
+            counts = latency_histogram(result)
+            for bin_index in np.flatnonzero(counts).tolist():
+                writer.writerow({**cell._asdict(), 'latency_upper_edge': upper_edges[bin_index],
+                                 'count': int(counts[bin_index])})
+
+
+def _analyze(
+        simulations: Dict[Tuple[float, int], SimulationResult],
+        queue_mechanism: str,
+        time_quantum: Optional[int],
+        output_dir: str,
+        formats: Sequence[str]
+) -> None:
+    if time_quantum is None:
+        analyze_simulations(simulations, queue_mechanism, output_dir, formats)
+    else:
+        analyze_simulations_rr(simulations, time_quantum, queue_mechanism, output_dir, formats)
+
+
+def write_report(
+        results: Dict[Cell, SimulationResult],
+        output_dir: str = 'reports',
+        formats: Sequence[str] = ('png',),
+        workers: int = 1
+) -> None:
+    """Render the figures of all the mechanisms (on `workers` processes) and write the summary and histogram tables."""
+    os.makedirs(output_dir, exist_ok=True)
+    write_summary(results, os.path.join(output_dir, SUMMARY_FILE_NAME))
+    write_latency_histograms(results, os.path.join(output_dir, HISTOGRAM_FILE_NAME))
+
+    # one job per figure set, in the sweep order
+    groups = list(dict.fromkeys(
+        (cell.queue_mechanism, cell.time_quantum, cell.servers, cell.cache_capacity) for cell in results
+    ))
+    jobs = [
+        (
+            select(results, queue_mechanism, time_quantum, servers, cache_capacity),
+            _label(queue_mechanism, servers, cache_capacity),
+            time_quantum,
+            output_dir,
+            formats,
+        )
+        for queue_mechanism, time_quantum, servers, cache_capacity in groups
+    ]
+    if workers <= 1:
+        for job in jobs:
+            _analyze(*job)
+        return
+
+    with ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+        for future in [pool.submit(_analyze, *job) for job in jobs]:
+            future.result()  # raise the rendering errors, if any
+
+
+def write_frontier_report(
+        frontiers: List[Frontier],
+        target: float,
+        output_dir: str = 'reports',
+        formats: Sequence[str] = ('png',)
+) -> None:
+    """Write the capacity frontier table and plot it."""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, FRONTIER_FILE_NAME), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=Frontier._fields)
+        writer.writeheader()
+        writer.writerows(frontier._asdict() for frontier in frontiers)
+
+    lines: Dict[str, List[Tuple[int, float]]] = {}
+    for frontier in frontiers:
+        label = _label(frontier.queue_mechanism, frontier.servers, frontier.cache_capacity)
+        if frontier.time_quantum is not None:
+            label += f' TQ={frontier.time_quantum}'
+        lines.setdefault(label, []).append((frontier.max_queue_size, frontier.arrival_rate))
+    plot_capacity_frontier(lines, target, output_dir, formats)
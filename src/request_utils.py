@@ -1,62 +1,232 @@
-import random
-from enum import Enum
-from typing import Optional, Iterator
+from enum import IntEnum
+from typing import Optional, Iterator, List, NamedTuple, Tuple, Dict
 
 import numpy as np
-from pydantic import BaseModel
 
 from src.consts import DEADLINE
+from src.resolver_cache import ResolverCacheModel
 
 
-class State(str, Enum):
+CHUNK_SIZE = 4096  # requests drawn at once by the lazy generators
+
+
+class State(IntEnum):
+    PENDING = 0  # no final state (yet) - waiting, in service or the simulation time is up
     FINISHED_SUCCESSFULLY = 1
     STARVED_AT_QUEUE = 2
     COULD_NOT_GET_INTO_QUEUE = 3
     FINISHED_AFTER_DEADLINE = 4
 
 
-class Request(BaseModel):
-    arrival_time: float
-    processing_time: float
+class RequestBatch(NamedTuple):
+    arrival_times: np.ndarray
+    processing_times: np.ndarray
+    is_in_cache: np.ndarray
+    is_in_disk: np.ndarray
+
+
+class RunStats(NamedTuple):
+    """Time integrals of the server state, accumulated by the simulator over the measured time (after the warm up)."""
+    simulation_time: float  # the measured time
+    busy_time: float  # total time the workers were processing requests (summed over the workers)
+    queue_length_area: float  # integral of the number of waiting requests over time
+    servers: int = 1
+
+
+class RequestTable:
+    """
+    Struct of arrays store of the simulated requests, a request is just a row index into the columns.
+    The columns are allocated with spare capacity, only the first `len(table)` rows are valid.
+    """
+
+    _COLUMNS = (
+        'arrival_time',
+        'processing_time',
+        'start_processing_time',
+        'end_processing_time',
+        'processing_time_leftover',
+        'finish_state',
+        'is_in_cache',
+    )
+
+    def __init__(self, capacity: int = CHUNK_SIZE, deadline: float = DEADLINE):
+        self.deadline = deadline
+        self.stats: Optional[RunStats] = None
+        self._size = 0
+
+        self.arrival_time = np.empty(capacity)
+        self.processing_time = np.empty(capacity)
+        self.start_processing_time = np.full(capacity, np.nan)
+        self.end_processing_time = np.full(capacity, np.nan)
+        self.processing_time_leftover = np.full(capacity, np.nan)  # in use only for RR
+        self.finish_state = np.zeros(capacity, dtype=np.int8)  # State values
+        self.is_in_cache = np.zeros(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray], deadline: float = DEADLINE) -> 'RequestTable':
+        table = cls(capacity=0, deadline=deadline)
+        for name in cls._COLUMNS:
+            setattr(table, name, np.asarray(columns[name], dtype=getattr(table, name).dtype))
+        table._size = len(table.arrival_time)
+        return table
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """The valid rows of every column, by the column name."""
+        return {name: getattr(self, name)[:self._size] for name in self._COLUMNS}
+
+    def append(self, batch: RequestBatch) -> None:
+        """Add new requests as rows `len(table)` onwards (may reallocate the columns)."""
+        count = len(batch.arrival_times)
+        self._reserve(self._size + count)
+        self.arrival_time[self._size:self._size + count] = batch.arrival_times
+        self.processing_time[self._size:self._size + count] = batch.processing_times
+        self.is_in_cache[self._size:self._size + count] = batch.is_in_cache
+        self._size += count
+
+    def drop_head(self, count: int) -> None:
+        """Forget the first `count` rows, the rest of the rows are renumbered from 0."""
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            column[:self._size - count] = column[count:self._size]
+            column[self._size - count:self._size] = np.nan if column.dtype.kind == 'f' else 0
+        self._size -= count
+
+    def trim(self) -> None:
+        """Drop the spare capacity, so every column is exactly `len(table)` long."""
+        self._resize(self._size)
+
+    def state_counts(self) -> np.ndarray:
+        """Number of requests at each State, indexed by the State value."""
+        return np.bincount(self.finish_state[:self._size], minlength=len(State))
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity > len(self.arrival_time):
+            self._resize(max(capacity, 2 * len(self.arrival_time)))
+
+    def _resize(self, capacity: int) -> None:
+        if capacity == len(self.arrival_time):
+            return
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            resized = np.full(capacity, np.nan, dtype=column.dtype) if column.dtype.kind == 'f' \
+                else np.zeros(capacity, dtype=column.dtype)
+            resized[:min(capacity, len(column))] = column[:capacity]
+            setattr(self, name, resized)
+
+
+def _request_streams(seed: Optional[int]) -> List[np.random.Generator]:
+    # an independent stream for every drawn quantity, so the drawn values don't depend on how many
+    # requests are drawn at once - a single batch, chunks of any size and one by one give the same workload
+    return [np.random.default_rng(stream_seed) for stream_seed in np.random.SeedSequence(seed).spawn(6)]
+
+
+def _draw_requests(
+        streams: List[np.random.Generator],
+        arrival_rate: float,
+        first_arrival_time: float,
+        size: int,
+        cache_model: Optional[ResolverCacheModel] = None
+) -> Tuple[RequestBatch, float]:
+    arrivals_stream, cache_stream, disk_stream, network_stream, cache_hit_stream, disk_hit_stream = streams
+
+    # Poisson's arrival times differences between 2 consecutive requests is actually X~Exp(1/𝜆)
+    # X~P(𝜆) only gives the count, not the times
+    gaps = arrivals_stream.exponential(1 / arrival_rate, size)
+    # cumsum adds one gap at a time, exactly like a running "arrival_time += gap"
+    arrival_times = np.cumsum(np.concatenate(([first_arrival_time], gaps[:-1])))
+    next_arrival_time = arrival_times[-1] + gaps[-1]
+
+    # CACHE_T~N(0.0505, 0.012625), 0.001<=t=<0.1
+    cache_search_times = cache_stream.normal(0.0505, 0.012625, size)
+    # DISK_T~N(10,2.25) 1<=t=<20
+    disk_search_times = disk_stream.normal(10, 2.25, size)
+    # NETWORK_T~N(80,15) 20<=t=<140
+    recursive_requests_times = network_stream.normal(80, 15, size)
+
+    if cache_model is None:
+        is_in_cache = cache_hit_stream.random(size) < 0.7  # there's 70% chance of cache hit
+    else:  # the hits of the queried names in the simulated cache
+        is_in_cache = cache_model.hits(cache_hit_stream, arrival_times)
+    is_in_disk = disk_hit_stream.random(size) < 0.3  # 30% chance of disk hit, given that the request is not cached
+
+    # always look for result in cache first
+    processing_times = cache_search_times
+    processing_times += np.where(is_in_cache, 0, disk_search_times)
+    processing_times += np.where(is_in_cache | is_in_disk, 0, recursive_requests_times)
+
+    return RequestBatch(arrival_times, processing_times, is_in_cache, is_in_disk), float(next_arrival_time)
+
+
+class RequestChunks:
+    """
+    Iterator of the endless workload, drawn lazily in chunks of `chunk_size` requests.
+    Unlike a generator it can be pickled (with the state of its random streams), to checkpoint a simulation.
+    Given a cache model, the cache hits come from it rather than from the fixed hit chance.
+    """
+
+    def __init__(
+            self,
+            arrival_rate: float,
+            seed: Optional[int] = None,
+            chunk_size: int = CHUNK_SIZE,
+            cache_model: Optional[ResolverCacheModel] = None
+    ):
+        self.arrival_rate = arrival_rate
+        self.chunk_size = chunk_size
+        self.cache_model = cache_model
+        self._streams = _request_streams(seed)
+        self._arrival_time = 0  # of the first request of the next chunk
+
+    def __iter__(self) -> 'RequestChunks':
+        return self
+
+    def __next__(self) -> RequestBatch:
+        chunk, next_arrival_time = _draw_requests(
+            self._streams, self.arrival_rate, self._arrival_time, self.chunk_size, self.cache_model
+        )
+        self._arrival_time = next_arrival_time
+        return chunk
+
 
-    deadline: float = DEADLINE
-    start_processing_time: Optional[float] = None
-    end_processing_time: Optional[float] = None
-    finish_state: Optional[State] = None
+def generate_request_chunks(
+        arrival_rate: float,
+        seed: Optional[int] = None,
+        chunk_size: int = CHUNK_SIZE,
+        cache_model: Optional[ResolverCacheModel] = None
+) -> Iterator[RequestBatch]:
+    """Lazily yield the endless workload in chunks of `chunk_size` requests."""
+    return RequestChunks(arrival_rate, seed, chunk_size, cache_model)
 
-    processing_time_leftover: Optional[float] = None  # in use only for RR
 
+def generate_requests_batch(arrival_rate: float, horizon: float, seed: Optional[int] = None) -> RequestBatch:
+    """Draw all the requests which arrive up to `horizon` at once."""
+    streams = _request_streams(seed)
+    # enough requests to cover the horizon in a single draw, unless the Poisson count is way above its mean
+    expected_count = arrival_rate * horizon
+    size = int(expected_count + 6 * np.sqrt(expected_count)) + 16
 
-def generate_new_request(arrival_rate: float) -> Iterator[Request]:
+    chunks = []
     arrival_time = 0
-    while True:
-        # CACHE_T~N(0.0505, 0.012625), 0.001<=t=<0.1
-        cache_search_time = np.random.normal(0.0505, 0.012625)
-        # DISK_T~N(10,2.25) 1<=t=<20
-        disk_search_time = np.random.normal(10, 2.25)
-        # NETWORK_T~N(80,15) 20<=t=<140
-        recursive_requests_time = np.random.normal(80, 15)
-
-        is_in_cache = random.randint(1, 10) <= 7  # there's 70% chance of cache hit
-        is_in_disk = random.randint(1, 10) <= 3  # there's 80% chance of disk hit, given that the request is not cached
-
-        # always look for result in cache first
-        processing_time = cache_search_time
-        processing_time += disk_search_time if not is_in_cache else 0
-        processing_time += recursive_requests_time if not is_in_cache and not is_in_disk else 0
-
-        yield Request(
-            arrival_time=arrival_time,
-            processing_time=processing_time,
-        )
+    while arrival_time <= horizon:
+        chunk, arrival_time = _draw_requests(streams, arrival_rate, arrival_time, size)
+        chunks.append(chunk)
+
+    batch = RequestBatch(*(np.concatenate(column) for column in zip(*chunks)))
+    count = np.searchsorted(batch.arrival_times, horizon, side='right')
+    return RequestBatch(*(column[:count] for column in batch))
+
 
-        # Poisson's arrival times differences between 2 consecutive requests is actually X~Exp(1/𝜆)
-        # X~P(𝜆) only gives the count, not the times
-        arrival_time += np.random.exponential(1 / arrival_rate)
+def generate_new_request(arrival_rate: float, seed: Optional[int] = None) -> Iterator[Tuple[float, float]]:
+    """Yield (arrival_time, processing_time) of one request at a time."""
+    for chunk in generate_request_chunks(arrival_rate, seed):
+        yield from zip(chunk.arrival_times.tolist(), chunk.processing_times.tolist())
 
 
-def has_request_starved_at_queue(request: Request, current_time: float) -> bool:
+def has_request_starved_at_queue(arrival_time: float, current_time: float, deadline: float = DEADLINE) -> bool:
     # if the request was in queue for too long (more than it's deadline) - the queue "kicked it out"
     # before the server could process it
-    request_waiting_time = current_time - request.arrival_time
-    return request_waiting_time > request.deadline
+    request_waiting_time = current_time - arrival_time
+    return request_waiting_time > deadline
@@ -0,0 +1,157 @@
+"""
+Model of the resolver's answer cache, for workloads whose cache hits follow the cache size and the query popularity.
+
+Query names are drawn from a Zipf popularity over a finite catalog of names, and looked up in arrival order in
+a bounded cache with LRU, LFU or TTL eviction - a miss caches the answer. Every cache is O(1) per lookup.
+A cache policy registers its implementation by name with `register_cache`.
+"""
+import collections
+from typing import Callable, Dict, NamedTuple, Type
+
+import numpy as np
+
+CACHES: Dict[str, Type['ResolverCache']] = {}
+
+
+def register_cache(name: str) -> Callable[[Type['ResolverCache']], Type['ResolverCache']]:
+    def register(cache_class: Type['ResolverCache']) -> Type['ResolverCache']:
+        CACHES[name] = cache_class
+        return cache_class
+    return register
+
+
+class ResolverCache:
+    """Bounded cache of the answers by the query name, subclasses implement the eviction."""
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl  # milliseconds an answer stays valid, only the TTL policy expires answers
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def lookup(self, name: int, now: float) -> bool:
+        """Whether the answer of `name` is cached at time `now`, caches it if not."""
+        raise NotImplementedError
+
+
+@register_cache('lru')
+class LruCache(ResolverCache):
+    """Evicts the least recently used answer."""
+
+    def __init__(self, capacity: int, ttl: float):
+        super().__init__(capacity, ttl)
+        self._names: Dict[int, None] = collections.OrderedDict()  # from the least to the most recently used
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def lookup(self, name: int, now: float) -> bool:
+        if name in self._names:
+            self._names.move_to_end(name)
+            return True
+        if self.capacity > 0:
+            if len(self._names) >= self.capacity:
+                self._names.popitem(last=False)
+            self._names[name] = None
+        return False
+
+
+@register_cache('lfu')
+class LfuCache(ResolverCache):
+    """Evicts the least frequently used answer (the least recently used one among them)."""
+
+    def __init__(self, capacity: int, ttl: float):
+        super().__init__(capacity, ttl)
+        self._frequencies: Dict[int, int] = {}
+        # the names of every use count, in recency order - the buckets make the eviction O(1)
+        self._buckets: Dict[int, Dict[int, None]] = collections.defaultdict(collections.OrderedDict)
+        self._min_frequency = 0
+
+    def __len__(self) -> int:
+        return len(self._frequencies)
+
+    def lookup(self, name: int, now: float) -> bool:
+        frequency = self._frequencies.get(name)
+        if frequency is not None:
+            self._remove_from_bucket(name, frequency)
+            if self._min_frequency == frequency and frequency not in self._buckets:
+                self._min_frequency += 1
+            self._frequencies[name] = frequency + 1
+            self._buckets[frequency + 1][name] = None
+            return True
+
+        if self.capacity > 0:
+            if len(self._frequencies) >= self.capacity:
+                evicted_name, _ = self._buckets[self._min_frequency].popitem(last=False)
+                if not self._buckets[self._min_frequency]:
+                    del self._buckets[self._min_frequency]
+                del self._frequencies[evicted_name]
+            self._frequencies[name] = 1
+            self._buckets[1][name] = None
+            self._min_frequency = 1
+        return False
+
+    def _remove_from_bucket(self, name: int, frequency: int) -> None:
+        bucket = self._buckets[frequency]
+        del bucket[name]
+        if not bucket:
+            del self._buckets[frequency]
+
+
+@register_cache('ttl')
+class TtlCache(ResolverCache):
+    """Answers expire `ttl` after they were cached, a full cache evicts the one which expires first."""
+
+    def __init__(self, capacity: int, ttl: float):
+        super().__init__(capacity, ttl)
+        # the expiry times in the caching order, which is the expiry order too as all the answers share the TTL
+        self._expiry_times: Dict[int, float] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expiry_times)
+
+    def lookup(self, name: int, now: float) -> bool:
+        expiry_times = self._expiry_times
+        # drop the expired answers from the front, each answer is dropped once so it's O(1) amortized
+        while expiry_times and next(iter(expiry_times.values())) <= now:
+            expiry_times.popitem(last=False)
+        if name in expiry_times:
+            return True
+        if self.capacity > 0:
+            if len(expiry_times) >= self.capacity:
+                expiry_times.popitem(last=False)
+            expiry_times[name] = now + self.ttl
+        return False
+
+
+class ResolverSettings(NamedTuple):
+    """The sweep wide settings of the cache model, the capacity is swept per cell."""
+    policy: str = 'lru'
+    names: int = 100_000  # size of the catalog of the queried names
+    zipf_exponent: float = 1.0
+    ttl: float = 300_000  # milliseconds, for the TTL policy
+
+    def model(self, capacity: int) -> 'ResolverCacheModel':
+        return ResolverCacheModel(CACHES[self.policy](capacity, self.ttl), self.names, self.zipf_exponent)
+
+
+class ResolverCacheModel:
+    """Draws the query names and looks them up in the cache, to tell which requests are cache hits."""
+
+    def __init__(self, cache: ResolverCache, names: int, zipf_exponent: float):
+        self.cache = cache
+        # the rank k name is queried with probability ~ 1 / k^zipf_exponent
+        weights = 1 / np.arange(1, names + 1) ** zipf_exponent
+        self._cumulative_probabilities = np.cumsum(weights / weights.sum())
+        self._cumulative_probabilities[-1] = 1  # no rounding gap past the last name
+
+    def hits(self, stream: np.random.Generator, arrival_times: np.ndarray) -> np.ndarray:
+        """Whether each of the requests (in arrival order) is a cache hit."""
+        names = np.searchsorted(self._cumulative_probabilities, stream.random(len(arrival_times)), side='right')
+        lookup = self.cache.lookup
+        return np.fromiter(
+            (lookup(name, now) for name, now in zip(names.tolist(), arrival_times.tolist())),
+            dtype=bool,
+            count=len(arrival_times),
+        )
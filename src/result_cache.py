@@ -0,0 +1,88 @@
+"""
+On-disk cache of simulation results.
+
+A result is keyed by everything which determines it - the simulation parameters, the seed and the version
+of the simulation code, and stored as an uncompressed .npz of the RequestTable columns,
+so a later analysis loads it without simulating again.
+"""
+import functools
+import hashlib
+import os
+import pathlib
+import tempfile
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.request_utils import RequestTable, RunStats
+
+# the modules which affect the simulation results (plotting changes don't invalidate the cache)
+_SIMULATION_SOURCES = ('consts.py', 'request_utils.py', 'resolver_cache.py', 'simulators/*.py')
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """Hash of the simulation code."""
+    source_root = pathlib.Path(__file__).parent
+    digest = hashlib.sha256()
+    for pattern in _SIMULATION_SOURCES:
+        for path in sorted(source_root.glob(pattern)):
+            digest.update(path.relative_to(source_root).as_posix().encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """Directory of cached RequestTables, the least recently used entries are evicted above `max_bytes`."""
+
+    def __init__(self, directory: str, max_bytes: int = 2 ** 31, force: bool = False):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.force = force  # ignore the cached results (they are still overwritten by the new ones)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: Tuple) -> pathlib.Path:
+        digest = hashlib.sha256(repr((*key, code_version())).encode()).hexdigest()
+        return self.directory / f'{digest}.npz'
+
+    def get(self, key: Tuple) -> Optional[RequestTable]:
+        if self.force:
+            return None
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                table = RequestTable.from_columns(entry, deadline=float(entry['deadline']))
+                simulation_time, busy_time, queue_length_area, servers = entry['stats'].tolist()
+                table.stats = RunStats(simulation_time, busy_time, queue_length_area, int(servers))
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError, KeyError):  # missing, or a partially evicted / corrupted entry
+            return None
+        return table
+
+    def put(self, key: Tuple, table: RequestTable) -> None:
+        # write to a temporary file first, so concurrent workers never see a partial entry
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        with os.fdopen(descriptor, 'wb') as file:
+            np.savez(file, deadline=table.deadline, stats=np.array(table.stats), key=repr(key), **table.columns())
+        os.replace(temporary_path, self.path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries, until the cache fits into max_bytes."""
+        entries = []
+        for path in self.directory.glob('*.npz'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by another worker meanwhile
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
@@ -1,46 +1,210 @@
-import itertools
-from typing import List, Dict, Tuple
+import argparse
+import cProfile
+import functools
+import os
+import pstats
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
-from tqdm import tqdm
+from src.consts import SIMULATION_TIME
+from src.distributed import open_broker, run_distributed_sweep, work
+from src.report import write_frontier_report, write_report
+from src.search import run_search
+from src.resolver_cache import CACHES, ResolverSettings
+from src.result_cache import ResultCache
+from src.simulators import instrumentation
+from src.simulators.kernels import BACKENDS
+from src.sweep import SIMULATORS, Cell, build_cells, run_sweep, run_cell, replicated
+from src.trace import mean_arrival_rate
 
-from src import consts
-from src.analyzer import analyze_simulations, analyze_simulations_rr
-from src.consts import MAX_QUEUE_SIZES, ARRIVAL_RATES
-from src.request_utils import Request
-from src.simulators import rr, fifo, lifo
 
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Simulate the DNS server queue mechanisms over the parameters grid')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes to spread the sweep on')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='seed of the whole sweep, for reproducible (and cacheable) runs, -1 for a random one',
+    )
+    parser.add_argument(
+        '--replications', type=int, default=1,
+        help='maximal independent runs of each cell, the mean and confidence interval are reported',
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=1,
+        help='stop replicating a cell once the success percent confidence interval half width is below it',
+    )
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level of the intervals')
+    parser.add_argument('--cache-dir', default='.simulation_cache', help='directory of the cached results')
+    parser.add_argument('--cache-size', type=int, default=2048, help='maximal size of the cache, in MB')
+    parser.add_argument('--no-cache', action='store_true', help="don't read or write cached results")
+    parser.add_argument('--force', action='store_true', help='recompute the cached results (and overwrite them)')
+    parser.add_argument(
+        '--streaming', action='store_true',
+        help='keep only online aggregated metrics of the requests, for long or extreme traffic runs',
+    )
+    parser.add_argument(
+        '--backend', default='python', choices=BACKENDS,
+        help='implementation of the single worker FIFO, LIFO and RR runs, numba needs Numba to be installed',
+    )
+    parser.add_argument(
+        '--trace',
+        help='replay a recorded query log (a JSONL file or a columnar trace directory) instead of the synthetic '
+             'workload, the arrival rates grid is replaced by the trace rate',
+    )
+    parser.add_argument(
+        '--simulation-time', type=float, default=SIMULATION_TIME, help='milliseconds of simulated traffic per cell',
+    )
+    parser.add_argument(
+        '--checkpoint-dir',
+        help='checkpoint every seeded cell run here, so a later sweep with a longer --simulation-time continues '
+             'the runs instead of restarting them',
+    )
+    parser.add_argument(
+        '--warm-up', type=float, default=0,
+        help='milliseconds of the initial transient, whose requests are simulated but left out of the results',
+    )
+    parser.add_argument(
+        '--mechanisms', nargs='+', default=list(SIMULATORS), choices=list(SIMULATORS),
+        help='queue mechanisms to sweep over',
+    )
+    parser.add_argument(
+        '--servers', type=int, nargs='+', default=[1], help='numbers of workers sharing the queue, to sweep over',
+    )
+    parser.add_argument(
+        '--resolver-cache-sizes', type=int, nargs='+',
+        help='model the resolver cache with Zipf distributed query names, sweeping over these capacities '
+             '(in answers), instead of the fixed cache hit chance',
+    )
+    parser.add_argument(
+        '--resolver-policy', default=ResolverSettings.policy, choices=list(CACHES),
+        help='eviction policy of the modeled resolver cache',
+    )
+    parser.add_argument(
+        '--query-names', type=int, default=ResolverSettings.names, help='number of distinct queried names',
+    )
+    parser.add_argument(
+        '--zipf-exponent', type=float, default=ResolverSettings.zipf_exponent,
+        help='skew of the query names popularity, the rank k name is queried with probability ~ 1 / k^exponent',
+    )
+    parser.add_argument(
+        '--resolver-ttl', type=float, default=ResolverSettings.ttl,
+        help='milliseconds a cached answer stays valid, for the ttl policy',
+    )
+    parser.add_argument('--output-dir', default='reports', help='directory of the figures and the summary table')
+    parser.add_argument(
+        '--formats', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'], help='file formats of the figures',
+    )
+    parser.add_argument(
+        '--search-target', type=float,
+        help='instead of the grid, search the highest arrival rate which meets this success percent, '
+             'for every queue size and time quantum',
+    )
+    parser.add_argument(
+        '--search-precision', type=float, default=0.01, help='relative precision of the searched arrival rates',
+    )
+    parser.add_argument(
+        '--independent-candidates', action='store_true',
+        help='simulate every searched rate with its own random numbers, instead of common ones',
+    )
+    parser.add_argument(
+        '--broker',
+        help='distribute the sweep through this task broker (a SQLite file path, or scheme://location), '
+             'which workers on other hosts join with --worker-only',
+    )
+    parser.add_argument(
+        '--worker-only', action='store_true',
+        help='only run work units of the --broker sweep (on --workers processes), until there are none left',
+    )
+    parser.add_argument(
+        '--profile', metavar='MECHANISM,RATE,QUEUE_SIZE[,QUANTUM]',
+        help='instead of the sweep, simulate only this cell and report its instrumentation counters and profile. '
+             'the cell is simulated with the --seed itself (not the seed it gets in the sweep), bypassing the cache',
+    )
+    parser.add_argument(
+        '--profiler', default='cprofile', choices=['cprofile', 'sampling'],
+        help='profiler of the --profile cell, the sampling one barely slows the run down',
+    )
+    args = parser.parse_args()
+    if not 0 <= args.warm_up < args.simulation_time:
+        parser.error('--warm-up must be non negative and shorter than the --simulation-time')
+    if args.worker_only and args.broker is None:
+        parser.error('--worker-only needs the --broker of the sweep')
+    if args.trace is not None and args.replications > 1:
+        parser.error('a trace is a single workload, it has no independent replications')
+    if args.trace is not None and args.search_target is not None:
+        parser.error("a trace has a fixed arrival rate, there's nothing to search")
+    if args.trace is not None and args.resolver_cache_sizes is not None:
+        parser.error("a trace records its own cache hits, there's no resolver cache to model")
+    return args
 
-def _run_fifo_simulation() -> Dict[Tuple[float, int], List[Request]]:
-    return {
-        (arrival_rate, max_queue_size): fifo.simulate(max_queue_size, arrival_rate)
-        for arrival_rate, max_queue_size in tqdm(list(itertools.product(ARRIVAL_RATES, MAX_QUEUE_SIZES)))
-    }
 
+def _parse_cell(spec: str, servers: int, cache_capacity: Optional[int]) -> Cell:
+    queue_mechanism, arrival_rate, max_queue_size, *time_quantum = spec.split(',')
+    return Cell(queue_mechanism, float(arrival_rate), int(max_queue_size),
+                int(time_quantum[0]) if time_quantum else None, servers, cache_capacity)
 
-def _run_lifo_simulation() -> Dict[Tuple[float, int], List[Request]]:
-    return {
-        (arrival_rate, max_queue_size): lifo.simulate(max_queue_size, arrival_rate)
-        for arrival_rate, max_queue_size in tqdm(list(itertools.product(ARRIVAL_RATES, MAX_QUEUE_SIZES)))
-    }
 
-
-def _run_rr_simulation(time_quantum: int) -> Dict[Tuple[float, int], List[Request]]:
-    return {
-        (arrival_rate, max_queue_size): rr.simulate(max_queue_size, arrival_rate, time_quantum)
-        for arrival_rate, max_queue_size in tqdm(list(itertools.product(ARRIVAL_RATES, MAX_QUEUE_SIZES)))
-    }
+def profile_cell(cell: Cell, seed, run, profiler: str, output_dir: str) -> None:
+    """
+    Simulate a single cell with `seed` in this process, with the instrumentation and a profiler attached.
+    `run` should not read a result cache, or only the loading of the cached result would be profiled.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with instrumentation.instrumented() as counters:
+        if profiler == 'cprofile':
+            with cProfile.Profile() as profile:
+                run(cell, seed)
+            profile.dump_stats(os.path.join(output_dir, 'profile.pstats'))
+            pstats.Stats(profile).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(25)
+        else:
+            with instrumentation.SamplingProfiler() as sampler:
+                run(cell, seed)
+            for function, own_percent, cumulative_percent in sampler.top():
+                print(f'{own_percent:6.2f}% {cumulative_percent:6.2f}%  {function}')
+    print(counters.report())
 
 
 def main():
-    fifo_results = _run_fifo_simulation()
-    analyze_simulations(fifo_results, 'FIFO')
-
-    lifo_results = _run_lifo_simulation()
-    analyze_simulations(lifo_results, 'LIFO')
-
-    for time_quantum in consts.TIME_QUANTUMS:
-        rr_results = _run_rr_simulation(time_quantum)
-        analyze_simulations_rr(rr_results, time_quantum, 'RoundRobin')
+    args = _parse_args()
+    if args.worker_only:
+        broker = open_broker(args.broker)
+        with ProcessPoolExecutor(max(args.workers, 1)) as pool:
+            for future in [pool.submit(work, broker) for _ in range(max(args.workers, 1))]:
+                future.result()
+        return
+    seed = None if args.seed == -1 else args.seed
+    cache = None
+    if not args.no_cache and args.profile is None:  # a profiled cell is always simulated
+        cache = ResultCache(args.cache_dir, args.cache_size * 2 ** 20, args.force)
+    resolver = ResolverSettings(args.resolver_policy, args.query_names, args.zipf_exponent, args.resolver_ttl)
+    cache_capacities = args.resolver_cache_sizes or [None]
+    if args.replications > 1:
+        run = replicated(args.tolerance, args.replications, confidence=args.confidence, cache=cache,
+                         streaming=args.streaming, backend=args.backend, warm_up=args.warm_up, resolver=resolver,
+                         simulation_time=args.simulation_time, checkpoint_dir=args.checkpoint_dir)
+    else:
+        run = functools.partial(run_cell, cache=cache, streaming=args.streaming, trace=args.trace,
+                                backend=args.backend, warm_up=args.warm_up, resolver=resolver,
+                                simulation_time=args.simulation_time, checkpoint_dir=args.checkpoint_dir)
+    if args.profile is not None:
+        cell = _parse_cell(args.profile, args.servers[0], cache_capacities[0])
+        profile_cell(cell, seed, run, args.profiler, args.output_dir)
+        return
+    if args.search_target is not None:
+        frontiers = run_search(args.search_target, args.mechanisms, servers_counts=args.servers,
+                               cache_capacities=cache_capacities, workers=args.workers, seed=seed, run=run,
+                               precision=args.search_precision, common_random_numbers=not args.independent_candidates)
+        write_frontier_report(frontiers, args.search_target, args.output_dir, args.formats)
+        return
+    if args.trace is None:
+        cells = build_cells(args.mechanisms, servers_counts=args.servers, cache_capacities=cache_capacities)
+    else:
+        cells = build_cells(args.mechanisms, [mean_arrival_rate(args.trace)], servers_counts=args.servers)
+    if args.broker is None:
+        results = run_sweep(cells, args.workers, seed, run)
+    else:
+        results = run_distributed_sweep(open_broker(args.broker), cells, args.workers, seed, run)
+    write_report(results, args.output_dir, args.formats, args.workers)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,104 @@
+"""
+Adaptive search of the capacity frontier, instead of the exhaustive grid of arrival rates.
+
+For every (queue mechanism, queue size, time quantum, servers, resolver cache size) the success percent falls
+as the arrival rate grows, so the highest rate which still meets a target success percent (the knee) is found
+by bisection over the log of the rate - a precise rate takes about a dozen simulations, while the grid only brackets it.
+With common random numbers all the candidate rates (and all the searches) simulate the same random streams,
+so the compared points differ by their parameters and not by their noise, which keeps the bisection monotone.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from tqdm import tqdm
+
+from src.analyzer import SimulationResult, result_success_percent
+from src.consts import ARRIVAL_RATES, MAX_QUEUE_SIZES, TIME_QUANTUMS
+from src.sweep import SIMULATORS, Cell, build_cells, run_cell, spawn_seeds
+
+MAX_BISECTIONS = 64
+
+
+class Frontier(NamedTuple):
+    queue_mechanism: str
+    max_queue_size: int
+    time_quantum: Optional[int]
+    servers: int
+    cache_capacity: Optional[int]
+    arrival_rate: float  # the highest rate which meets the target, NaN if even the lowest rate doesn't
+    success_percent: float  # at that rate
+    simulations: int
+
+
+def find_capacity(
+        cell: Cell,
+        target: float,
+        seed: Optional[int] = None,
+        run: Callable[[Cell, Optional[int]], SimulationResult] = run_cell,
+        low: float = min(ARRIVAL_RATES),
+        high: float = max(ARRIVAL_RATES),
+        precision: float = 0.01,
+        common_random_numbers: bool = True
+) -> Frontier:
+    """
+    Bisect the arrival rate of `cell` in [low, high], until the frontier is bracketed within a `precision` ratio.
+    A frontier beyond `high` is reported as `high`.
+    """
+    # a seed per candidate, either the same one (common random numbers) or independent ones
+    candidate_seeds = iter([seed] * MAX_BISECTIONS if common_random_numbers else spawn_seeds(MAX_BISECTIONS, seed))
+    percents: Dict[float, float] = {}
+
+    def meets_target(arrival_rate: float) -> bool:
+        result = run(cell._replace(arrival_rate=arrival_rate), next(candidate_seeds))
+        percents[arrival_rate] = result_success_percent(result)
+        return percents[arrival_rate] >= target
+
+    if not meets_target(low):
+        return Frontier(cell.queue_mechanism, cell.max_queue_size, cell.time_quantum, cell.servers,
+                        cell.cache_capacity, math.nan, percents[low], len(percents))
+    if not meets_target(high):
+        while high / low > 1 + precision and len(percents) < MAX_BISECTIONS:
+            middle = math.sqrt(low * high)  # the rates span decades, so bisect their log
+            if meets_target(middle):
+                low = middle
+            else:
+                high = middle
+    else:
+        low = high
+    return Frontier(cell.queue_mechanism, cell.max_queue_size, cell.time_quantum, cell.servers,
+                    cell.cache_capacity, low, percents[low], len(percents))
+
+
+def run_search(
+        target: float,
+        queue_mechanisms: Sequence[str] = tuple(SIMULATORS),
+        max_queue_sizes: Sequence[int] = MAX_QUEUE_SIZES,
+        time_quantums: Sequence[int] = TIME_QUANTUMS,
+        servers_counts: Sequence[int] = (1,),
+        cache_capacities: Sequence[Optional[int]] = (None,),
+        workers: int = 1,
+        seed: Optional[int] = None,
+        run: Callable[[Cell, Optional[int]], SimulationResult] = run_cell,
+        precision: float = 0.01,
+        common_random_numbers: bool = True
+) -> List[Frontier]:
+    """Find the capacity frontier of every queue size (and time quantum), using `workers` processes."""
+    cells = build_cells(
+        queue_mechanisms, [max(ARRIVAL_RATES)], max_queue_sizes, time_quantums, servers_counts, cache_capacities
+    )
+    # with common random numbers every search simulates the same streams as well
+    seeds = spawn_seeds(1, seed) * len(cells) if common_random_numbers else spawn_seeds(len(cells), seed)
+    options = {'run': run, 'precision': precision, 'common_random_numbers': common_random_numbers}
+    if workers <= 1:
+        return [find_capacity(cell, target, cell_seed, **options) for cell, cell_seed in tqdm(list(zip(cells, seeds)))]
+
+    frontiers = {}
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {
+            pool.submit(find_capacity, cell, target, cell_seed, **options): cell
+            for cell, cell_seed in zip(cells, seeds)
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            frontiers[futures[future]] = future.result()
+    return [frontiers[cell] for cell in cells]
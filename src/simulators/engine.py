@@ -0,0 +1,326 @@
+"""
+Next-event simulation core shared by all the queue disciplines.
+
+Instead of moving the clock by a fixed idle step, the engine keeps a heap ordered calendar of pending events
+and always jumps straight to the earliest one, so the run time grows with the number of requests
+and not with the simulated time.
+"""
+import heapq
+import os
+import pickle
+import tempfile
+from enum import IntEnum
+from typing import Dict, List, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from src.request_utils import RequestBatch, RequestTable, RunStats, State, has_request_starved_at_queue
+from src.simulators import instrumentation
+from src.simulators.queues import BoundedQueue
+from src.streaming_metrics import StreamingMetrics
+
+
+class Event(IntEnum):
+    # the order is the tie-breaker between events of the same time:
+    # new arrivals get into the queue before the server picks the next request (as in the time stepping loop)
+    ARRIVAL = 0
+    SERVICE_COMPLETE = 1
+    QUANTUM_EXPIRY = 2
+    DEADLINE_EXPIRY = 3
+
+
+class EventEngine:
+    """
+    Simulator of `servers` workers sharing a single queue, driven by an event calendar.
+    The queue discipline is given by the queue object, a preemptive discipline (SRPT) lets a new request
+    take over the worker of the in service request with the longest remaining time, if the new one is shorter.
+    Requests are rows of a RequestTable, which is filled lazily from the incoming chunks.
+    Given streaming metrics, the finished rows are folded into them and dropped from the table as the run goes.
+    The requests which arrive during the first `warm_up` milliseconds are simulated, but not measured.
+    A run can be checkpointed at its end, and the restored engine extended to a later simulation time.
+    """
+
+    def __init__(
+            self,
+            q: BoundedQueue,
+            request_chunks: Iterator[RequestBatch],
+            simulation_time: float,
+            time_quantum: Optional[float] = None,
+            metrics: Optional[StreamingMetrics] = None,
+            servers: int = 1,
+            preemptive: bool = False,
+            warm_up: float = 0
+    ):
+        if not 0 <= warm_up < simulation_time:
+            raise ValueError(f'The warm-up ({warm_up}) must be non negative and shorter than the simulation time '
+                             f'({simulation_time}), which is all that is measured after it')
+        self.q = q
+        self.request_chunks = request_chunks
+        self.simulation_time = simulation_time
+        self.time_quantum = time_quantum  # None means a request is served until it's done
+        self.metrics = metrics
+        self.servers = servers
+        self.preemptive = preemptive
+        self.warm_up = warm_up
+
+        self.table = RequestTable()
+        self.q.attach(self.table)
+        self.current_time = 0
+        self._events: List[Tuple[float, Event, int, int]] = []
+        self._next_sequence = 0
+        self._next_row = 0  # the next request to arrive
+        self._all_loaded = False  # whether every request up to the simulation time is in the table
+        self._held_chunk: Optional[RequestBatch] = None  # the loaded requests which arrive after the simulation time
+        self._started = False
+        # the rows in service, by the sequence and time of their SERVICE_COMPLETE / QUANTUM_EXPIRY event,
+        # these events in the calendar are the min-heap of the workers' free times
+        self._in_service: Dict[int, Tuple[int, float]] = {}
+        self._busy_time = 0
+        self._queue_length_area = 0
+
+        if instrumentation.active() is not None:  # otherwise the handlers are left as they are, at no cost
+            instrumentation.active().attach(self)
+
+    def run(self, checkpoint: Optional[str] = None) -> Union[RequestTable, StreamingMetrics]:
+        """Simulate until the simulation time, saving the state to the `checkpoint` path (before the results)."""
+        if not self._started:
+            self._started = True
+            self._schedule_next_arrival()
+        if self.current_time < self.warm_up:
+            self._advance(self.warm_up)
+            self._advance_clock(self.warm_up)
+            self._busy_time = self._queue_length_area = 0  # the transient isn't measured
+        self._advance(self.simulation_time)
+        # the time from the last event to the end only goes into the stats, the clock stays at the last event,
+        # so a resumed run accumulates the integrals over the same intervals as an uninterrupted one
+        elapsed_time = self.simulation_time - self.current_time
+        stats = RunStats(
+            self.simulation_time - self.warm_up,
+            self._busy_time + len(self._in_service) * elapsed_time,
+            self._queue_length_area + len(self.q) * elapsed_time,
+            self.servers,
+        )
+        if checkpoint is not None:
+            self.save(checkpoint)
+
+        # the request in service when the time is up still gets its outcome, as it already started processing
+        while self._events:
+            event_time, event, sequence, row = heapq.heappop(self._events)
+            if event == Event.SERVICE_COMPLETE and self._is_in_service(row, sequence):
+                self.current_time = event_time
+                self._finish(row)
+
+        # requests which arrived exactly at the end of the simulation never got to the queue
+        while self._load_chunk():
+            pass
+        # the requests which arrived during the warm up are left out
+        warm_up_rows = int(np.searchsorted(self.table.arrival_time[:len(self.table)], self.warm_up))
+        if self.metrics is not None:
+            self.metrics.add(self.table, warm_up_rows, len(self.table))
+            self.metrics.stats = stats
+            return self.metrics
+        self.table.drop_head(warm_up_rows)
+        self.table.trim()
+        self.table.stats = stats
+        return self.table
+
+    def extend(self, simulation_time: float) -> None:
+        """Continue a restored run until the later `simulation_time`, on the next `run` (a run drains its events)."""
+        if simulation_time < self.simulation_time:
+            raise ValueError(f'The simulation time ({simulation_time}) is before the checkpointed one '
+                             f'({self.simulation_time}), a run can only be extended')
+        self.simulation_time = simulation_time
+        self._all_loaded = False
+        if not any(event == Event.ARRIVAL for _, event, _, _ in self._events):
+            self._schedule_next_arrival()  # the arrivals stopped at the former simulation time
+
+    def save(self, path: str) -> None:
+        """Pickle the whole state - the clock, events, queue, table, workload (with its random state) and metrics."""
+        directory = os.path.dirname(os.path.abspath(path))
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                pickle.dump(self, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)  # no partial checkpoint is left behind
+            raise
+
+    @staticmethod
+    def load(path: str) -> 'EventEngine':
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    def __getstate__(self) -> Dict:
+        # the instance level handlers are instrumentation wrappers, a restored engine is instrumented on its own
+        return {name: value for name, value in self.__dict__.items() if not hasattr(EventEngine, name)}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        if instrumentation.active() is not None:
+            instrumentation.active().attach(self)
+
+    def _advance(self, until: float) -> None:
+        # process the events before `until`
+        while self._events and self._events[0][0] < until:
+            event_time, event, sequence, row = heapq.heappop(self._events)
+            self._advance_clock(event_time)
+
+            if event == Event.ARRIVAL:
+                self._on_arrival(row)
+            elif event == Event.DEADLINE_EXPIRY:
+                self._on_deadline_expiry(row)
+            elif not self._is_in_service(row, sequence):
+                continue  # the service was preempted
+            elif event == Event.SERVICE_COMPLETE:
+                self._on_service_complete(row)
+            else:
+                self._on_quantum_expiry(row)
+
+            while len(self._in_service) < self.servers and self._dispatch():
+                pass
+
+    def _advance_clock(self, event_time: float) -> None:
+        # accumulate the time integrals of the server state until the next event
+        elapsed_time = event_time - self.current_time
+        self._queue_length_area += len(self.q) * elapsed_time
+        self._busy_time += len(self._in_service) * elapsed_time
+        self.current_time = event_time
+
+    def _schedule(self, event_time: float, event: Event, row: int) -> int:
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        heapq.heappush(self._events, (event_time, event, sequence, row))
+        return sequence
+
+    def _is_in_service(self, row: int, sequence: int) -> bool:
+        # whether the event is of the current service of the row
+        service = self._in_service.get(row)
+        return service is not None and service[0] == sequence
+
+    def _load_chunk(self) -> bool:
+        if self._all_loaded:
+            return False
+        chunk, self._held_chunk = self._held_chunk or next(self.request_chunks, None), None
+        count = 0 if chunk is None else int(np.searchsorted(chunk.arrival_times, self.simulation_time, 'right'))
+        if chunk is None or count < len(chunk.arrival_times):
+            self._all_loaded = True  # the rest of the requests arrive after the simulation time
+            if chunk is not None:  # kept for an extended run
+                self._held_chunk = RequestBatch(*(column[count:] for column in chunk))
+        if count and self.metrics is not None:
+            self._retire_finished_rows()
+        if count:
+            self.table.append(RequestBatch(*(column[:count] for column in chunk)))
+        return count > 0
+
+    def _retire_finished_rows(self) -> None:
+        # fold the leading rows which reached their final state, so the table only holds the "live" window
+        pending_rows = np.flatnonzero(self.table.finish_state[:len(self.table)] == State.PENDING)
+        count = int(pending_rows[0]) if len(pending_rows) else len(self.table)
+        if not count:
+            return
+        # the rows of the warm up are left out, they're always the first ones
+        warm_up_rows = int(np.searchsorted(self.table.arrival_time[:count], self.warm_up))
+        self.metrics.add(self.table, warm_up_rows, count)
+        self.table.drop_head(count)
+
+        # renumber the references to the remaining rows, the retired ones are only referred by no-op events
+        # and by starved requests which are still physically in the queue
+        self._events = [
+            (event_time, event, sequence, row - count)
+            for event_time, event, sequence, row in self._events if row >= count
+        ]
+        heapq.heapify(self._events)
+        self.q.renumber(count)
+        self._next_row -= count
+        self._in_service = {row - count: service for row, service in self._in_service.items()}
+
+    def _schedule_next_arrival(self) -> None:
+        if self._next_row == len(self.table) and not self._load_chunk():
+            return
+        row = self._next_row
+        self._next_row += 1
+        self._schedule(float(self.table.arrival_time[row]), Event.ARRIVAL, row)
+
+    def _on_arrival(self, row: int) -> None:
+        if self.q.push(row):
+            # the queue "kicks out" the request once it waited for longer than its deadline
+            self._schedule(float(self.table.arrival_time[row]) + self.table.deadline, Event.DEADLINE_EXPIRY, row)
+            if self.preemptive and len(self._in_service) >= self.servers:
+                self._preempt(row)
+        else:
+            self.table.finish_state[row] = State.COULD_NOT_GET_INTO_QUEUE
+        self._schedule_next_arrival()
+
+    def _on_deadline_expiry(self, row: int) -> None:
+        if self.table.finish_state[row] == State.PENDING and row not in self._in_service:  # still waiting
+            self.table.finish_state[row] = State.STARVED_AT_QUEUE
+            self.q.drop(row)
+
+    def _preempt(self, row: int) -> None:
+        # the new request takes over the worker of the longest remaining request, if it's shorter than it
+        longest_row, (_, end_time) = max(self._in_service.items(), key=lambda item: item[1][1])
+        remaining_time = end_time - self.current_time
+        if self.table.processing_time[row] >= remaining_time or self.q.full():
+            return
+        del self._in_service[longest_row]  # its SERVICE_COMPLETE event is ignored from now on
+        self.table.processing_time_leftover[longest_row] = remaining_time
+        # its DEADLINE_EXPIRY was ignored if it fired while the request was in service, so it's checked here,
+        # as for a request whose quantum expired
+        if has_request_starved_at_queue(self.table.arrival_time[longest_row], self.current_time, self.table.deadline):
+            self.table.finish_state[longest_row] = State.STARVED_AT_QUEUE
+        else:
+            self.q.push(longest_row)
+
+    def _on_service_complete(self, row: int) -> None:
+        self._finish(row)
+        del self._in_service[row]
+
+    def _on_quantum_expiry(self, row: int) -> None:
+        self.table.processing_time_leftover[row] -= self.time_quantum
+        del self._in_service[row]
+
+        # insert the unfinished request to the end of the queue, after all the requests which got in meanwhile
+        starved = has_request_starved_at_queue(self.table.arrival_time[row], self.current_time, self.table.deadline)
+        if starved or not self.q.push(row):
+            # pity, the request is thrown, although it hasn't finished
+            self.table.finish_state[row] = State.STARVED_AT_QUEUE
+
+    def _dispatch(self) -> bool:
+        """Start serving the next waiting request on a free worker, returns whether there was one."""
+        row = self.q.pop()
+        if row is None:
+            return False
+
+        table = self.table
+        if np.isnan(table.start_processing_time[row]):  # if not already was in queue
+            table.start_processing_time[row] = self.current_time
+            table.processing_time_leftover[row] = table.processing_time[row]
+
+        leftover = float(table.processing_time_leftover[row])
+        if self.time_quantum is None or leftover <= self.time_quantum:
+            end_time, event = self.current_time + leftover, Event.SERVICE_COMPLETE
+        else:
+            end_time, event = self.current_time + self.time_quantum, Event.QUANTUM_EXPIRY
+        self._in_service[row] = (self._schedule(end_time, event, row), end_time)
+        return True
+
+    def _finish(self, row: int) -> None:
+        table = self.table
+        table.processing_time_leftover[row] = 0
+        table.end_processing_time[row] = self.current_time
+        if self.current_time - table.arrival_time[row] <= table.deadline:
+            table.finish_state[row] = State.FINISHED_SUCCESSFULLY
+        else:
+            table.finish_state[row] = State.FINISHED_AFTER_DEADLINE
+
+
+def resume(
+        checkpoint: str,
+        simulation_time: float,
+        new_checkpoint: Optional[str] = None
+) -> Union[RequestTable, StreamingMetrics]:
+    """Continue a checkpointed simulation until the later `simulation_time`, as if it ran so from the start."""
+    engine = EventEngine.load(checkpoint)
+    engine.extend(simulation_time)
+    return engine.run(new_checkpoint)
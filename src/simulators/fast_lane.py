@@ -0,0 +1,44 @@
+import logging
+from typing import Iterator, Optional, Union
+
+from src.consts import SIMULATION_TIME
+from src.request_utils import generate_request_chunks, RequestBatch, RequestTable
+from src.simulators.engine import EventEngine
+from src.simulators.queues import QUEUES
+from src.streaming_metrics import StreamingMetrics
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger()
+
+
+def simulate(
+        max_queue_size: int,
+        arrival_rate: float,
+        simulation_time: float = SIMULATION_TIME,
+        seed: Optional[int] = None,
+        streaming: bool = False,
+        servers: int = 1,
+        request_chunks: Optional[Iterator[RequestBatch]] = None,
+        warm_up: float = 0,
+        checkpoint: Optional[str] = None
+) -> Union[RequestTable, StreamingMetrics]:
+    if request_chunks is None:  # a replayed trace replaces the synthetic workload of arrival_rate
+        request_chunks = generate_request_chunks(arrival_rate, seed)
+    metrics = StreamingMetrics() if streaming else None  # keep only the aggregated metrics, not the requests
+    results = _run_simulator(max_queue_size, request_chunks, simulation_time, metrics, servers, warm_up, checkpoint)
+    # logger.info('Cache Fast Lane Simulation Done')
+    return results
+
+
+def _run_simulator(
+        max_queue_size: int,
+        request_chunks: Iterator[RequestBatch],
+        simulation_time: float,
+        metrics: Optional[StreamingMetrics] = None,
+        servers: int = 1,
+        warm_up: float = 0,
+        checkpoint: Optional[str] = None
+) -> Union[RequestTable, StreamingMetrics]:
+    q = QUEUES['fast_lane'](max_queue_size)  # cache hits are served ahead of the disk and recursive lookups
+    engine = EventEngine(q, request_chunks, simulation_time, metrics=metrics, servers=servers, warm_up=warm_up)
+    return engine.run(checkpoint)
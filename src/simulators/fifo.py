@@ -1,9 +1,12 @@
 import logging
-import queue
-from typing import List, Iterator
+from typing import Iterator, Optional, Union
 
-from src.consts import IDLE_TIME, SIMULATION_TIME
-from src.request_utils import generate_new_request, Request, has_request_starved_at_queue, State
+from src.consts import SIMULATION_TIME
+from src.request_utils import generate_request_chunks, RequestBatch, RequestTable
+from src.simulators.engine import EventEngine
+from src.simulators import kernels
+from src.simulators.queues import QUEUES
+from src.streaming_metrics import StreamingMetrics
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger()
@@ -12,72 +15,35 @@ logger = logging.getLogger()
 def simulate(
         max_queue_size: int,
         arrival_rate: float,
-        simulation_time: float = SIMULATION_TIME
-) -> List[Request]:
-    requests_generator = generate_new_request(arrival_rate)
-    results = _run_simulator(max_queue_size, requests_generator, simulation_time)
+        simulation_time: float = SIMULATION_TIME,
+        seed: Optional[int] = None,
+        streaming: bool = False,
+        servers: int = 1,
+        request_chunks: Optional[Iterator[RequestBatch]] = None,
+        backend: str = 'python',
+        warm_up: float = 0,
+        checkpoint: Optional[str] = None
+) -> Union[RequestTable, StreamingMetrics]:
+    if request_chunks is None:  # a replayed trace replaces the synthetic workload of arrival_rate
+        request_chunks = generate_request_chunks(arrival_rate, seed)
+    # the kernels have no warm up or checkpoints
+    if not warm_up and checkpoint is None and kernels.use_kernel(backend, streaming, servers):
+        return kernels.simulate(kernels.FIFO, max_queue_size, request_chunks, simulation_time)
+    metrics = StreamingMetrics() if streaming else None  # keep only the aggregated metrics, not the requests
+    results = _run_simulator(max_queue_size, request_chunks, simulation_time, metrics, servers, warm_up, checkpoint)
     # logger.info('FIFO Simulation Done')
     return results
 
 
 def _run_simulator(
         max_queue_size: int,
-        requests_generator: Iterator[Request],
-        simulation_time: float
-) -> List[Request]:
-    q: queue.Queue[Request] = queue.Queue(max_queue_size)
-    all_requests = []
-
-    current_time = 0
-    incoming_request = next(requests_generator)  # First incoming request
-    all_requests.append(incoming_request)
-
-    while current_time < simulation_time:
-        while incoming_request.arrival_time <= current_time:
-            # generate artificial requests, and insert them to the queue
-            # stop when the latest generated request is "in the future"
-            try:
-                q.put(incoming_request, block=False)
-                incoming_request = next(requests_generator)
-                if incoming_request.arrival_time <= simulation_time:
-                    all_requests.append(incoming_request)
-            except queue.Full:
-                # now the queue is full, so any of the other incoming request (up to the current time) is thrown
-                # logger.debug('Queue is full')
-                if incoming_request.arrival_time <= simulation_time:
-                    incoming_request.finish_state = State.COULD_NOT_GET_INTO_QUEUE
-                    all_requests.append(incoming_request)
-
-                while incoming_request.arrival_time <= current_time:
-                    incoming_request = next(requests_generator)
-                    if incoming_request.arrival_time <= simulation_time:
-                        incoming_request.finish_state = State.COULD_NOT_GET_INTO_QUEUE
-                        all_requests.append(incoming_request)
-                break
-
-        if not q.empty():  # There are requests waiting to be handled
-            current_request = q.get()  # FIFO algorithm
-            if not has_request_starved_at_queue(current_request, current_time):
-                _handle_request(current_request, current_time)
-                current_time += current_request.processing_time
-            else:
-                # if the request waited for too long at the queue - just "throw" that request
-                current_request.finish_state = State.STARVED_AT_QUEUE
-                current_time += IDLE_TIME  # move the "clock"
-
-        else:  # no incoming requests - server is "at rest"
-            # logger.debug('Resting...')
-            current_time += IDLE_TIME  # move the "clock"
-    return all_requests
-
-
-def _handle_request(request: Request, current_time: int) -> None:
-    request.start_processing_time = current_time
-
-    current_time += request.processing_time  # processing simulation...
-    request.end_processing_time = current_time
-
-    if request.end_processing_time - request.arrival_time <= request.deadline:
-        request.finish_state = State.FINISHED_SUCCESSFULLY
-    else:
-        request.finish_state = State.FINISHED_AFTER_DEADLINE
+        request_chunks: Iterator[RequestBatch],
+        simulation_time: float,
+        metrics: Optional[StreamingMetrics] = None,
+        servers: int = 1,
+        warm_up: float = 0,
+        checkpoint: Optional[str] = None
+) -> Union[RequestTable, StreamingMetrics]:
+    q = QUEUES['fifo'](max_queue_size)  # FIFO algorithm, shared by all the workers
+    engine = EventEngine(q, request_chunks, simulation_time, metrics=metrics, servers=servers, warm_up=warm_up)
+    return engine.run(checkpoint)
@@ -0,0 +1,145 @@
+"""
+Opt-in instrumentation of the simulation hot path.
+
+Nothing is checked per event when it's off: only while an `instrumented()` block is active, every new EventEngine
+gets its handlers replaced (on the instance) by wrappers which count the events and time the phases.
+The sampling profiler is a lighter alternative to cProfile, it only records the stack on a CPU time timer.
+"""
+import collections
+import contextlib
+import signal
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.request_utils import State
+
+# the engine handlers of every phase: drawing (or reading) the requests, getting into the queue, serving them
+PHASES = {
+    'generation': ('_load_chunk',),
+    'admission': ('_on_arrival', '_on_deadline_expiry'),
+    'service': ('_dispatch', '_on_service_complete', '_on_quantum_expiry', '_preempt'),
+}
+
+
+class Instrumentation:
+    """Event counters and phase times (in seconds, excluding the nested phases) of the instrumented runs."""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = collections.Counter()
+        self.phase_times: Dict[str, float] = collections.defaultdict(float)
+        self._nested_time = 0.0  # time of the phases nested in the currently timed one
+
+    def attach(self, engine) -> None:
+        for phase, handlers in PHASES.items():
+            for handler in handlers:
+                setattr(engine, handler, self._timed(phase, getattr(engine, handler)))
+
+        counters, table, advance_clock = self.counters, engine.table, engine._advance_clock
+        on_arrival, on_deadline_expiry = engine._on_arrival, engine._on_deadline_expiry
+        on_quantum_expiry, dispatch = engine._on_quantum_expiry, engine._dispatch
+
+        def advance_clock_counted(event_time: float) -> None:
+            counters['loop_iterations'] += 1
+            advance_clock(event_time)
+
+        def on_arrival_counted(row: int) -> None:
+            on_arrival(row)
+            if table.finish_state[row] == State.COULD_NOT_GET_INTO_QUEUE:
+                counters['queue_full_drops'] += 1
+
+        def on_deadline_expiry_counted(row: int) -> None:
+            state = table.finish_state[row]
+            on_deadline_expiry(row)
+            if state != table.finish_state[row]:
+                counters['starvation_drops'] += 1
+
+        def on_quantum_expiry_counted(row: int) -> None:
+            on_quantum_expiry(row)
+            counters['rr_reenqueues' if table.finish_state[row] == State.PENDING else 'starvation_drops'] += 1
+
+        def dispatch_counted() -> bool:
+            dispatched = dispatch()
+            # the event driven counterpart of an idle tick - a worker is free, and there's nothing to serve
+            counters['dispatches' if dispatched else 'idle_events'] += 1
+            return dispatched
+
+        engine._advance_clock = advance_clock_counted
+        engine._on_arrival = on_arrival_counted
+        engine._on_deadline_expiry = on_deadline_expiry_counted
+        engine._on_quantum_expiry = on_quantum_expiry_counted
+        engine._dispatch = dispatch_counted
+        counters['runs'] += 1
+
+    def _timed(self, phase: str, function: Callable) -> Callable:
+        def timed(*args):
+            start = time.perf_counter()
+            outer_nested_time, self._nested_time = self._nested_time, 0.0
+            try:
+                return function(*args)
+            finally:
+                elapsed_time = time.perf_counter() - start
+                self.phase_times[phase] += elapsed_time - self._nested_time
+                self._nested_time = outer_nested_time + elapsed_time
+        return timed
+
+    def report(self) -> str:
+        lines = [f'{name}: {count:,}' for name, count in sorted(self.counters.items())]
+        lines += [f'{phase} time: {seconds:.3f}s' for phase, seconds in self.phase_times.items()]
+        return '\n'.join(lines)
+
+
+_active: Optional[Instrumentation] = None
+
+
+def active() -> Optional[Instrumentation]:
+    """The instrumentation of the current `instrumented()` block, None when it's off."""
+    return _active
+
+
+@contextlib.contextmanager
+def instrumented() -> Iterator[Instrumentation]:
+    """Instrument all the simulations run inside the block (in this process)."""
+    global _active
+    outer, _active = _active, Instrumentation()
+    try:
+        yield _active
+    finally:
+        _active = outer
+
+
+class SamplingProfiler:
+    """Statistical profiler, samples the running stack every `interval` seconds of CPU time (Unix only)."""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.samples: Dict[Tuple[str, ...], int] = collections.Counter()
+
+    def _sample(self, signal_number, frame) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_filename}:{code.co_firstlineno}({code.co_name})')
+            frame = frame.f_back
+        self.samples[tuple(stack)] += 1
+
+    def __enter__(self) -> 'SamplingProfiler':
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def top(self, count: int = 25) -> List[Tuple[str, float, float]]:
+        """(function, own percent, cumulative percent) of the most sampled functions."""
+        total = sum(self.samples.values())
+        own, cumulative = collections.Counter(), collections.Counter()
+        for stack, samples in self.samples.items():
+            own[stack[0]] += samples
+            for function in set(stack):
+                cumulative[function] += samples
+        return [
+            (function, 100 * samples / total, 100 * cumulative[function] / total)
+            for function, samples in own.most_common(count)
+        ]
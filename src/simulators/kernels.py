@@ -0,0 +1,195 @@
+"""
+Array kernels of the single worker FIFO, LIFO and RR simulations, JIT compiled with Numba when it's installed.
+
+A kernel walks the same event calendar as the EventEngine, but without a heap: with a single worker and a single
+deadline there are only 3 ordered streams of events - the arrivals, the deadline expiries (in arrival order)
+and the one service in progress, so the next event is the earliest of their heads (ties by the Event order).
+The kernels do the same float operations in the same order as the engine, so the results are bit identical.
+"""
+import logging
+from typing import Iterator, Optional
+
+import numpy as np
+
+from src.request_utils import RequestBatch, RequestTable, RunStats, State
+from src.simulators import instrumentation
+
+try:
+    import numba
+except ImportError:  # the kernels are an optional accelerator, the engine is used instead
+    numba = None
+
+logger = logging.getLogger()
+
+BACKENDS = ('python', 'numba')
+FIFO, LIFO = 0, 1  # the queue order of the kernel
+
+
+def _jit(function):
+    return numba.njit(cache=True)(function) if numba is not None else function
+
+
+@_jit
+def _simulate(
+        discipline,
+        max_queue_size,
+        time_quantum,
+        deadline,
+        simulation_time,
+        arrival_time,
+        processing_time,
+        start_processing_time,
+        end_processing_time,
+        processing_time_leftover,
+        finish_state
+):
+    size = len(arrival_time)
+    # the stored rows of the queue - a ring buffer for FIFO, a stack for LIFO. a row is stored at most once,
+    # starved rows are dropped lazily as in the BoundedQueue
+    stored = np.empty(max(size, 1), dtype=np.int64)
+    dropped = np.zeros(max(size, 1), dtype=np.bool_)
+    head, stored_count, queue_size = 0, 0, 0
+
+    current_time = 0.0
+    busy_time, queue_length_area = 0.0, 0.0
+    next_row = 0  # the next request to arrive
+    deadline_row = 0  # the next request whose deadline expiry is pending (rejected requests have none)
+    service_row, service_time, service_is_quantum = -1, np.inf, False
+
+    while True:
+        while deadline_row < next_row and finish_state[deadline_row] == State.COULD_NOT_GET_INTO_QUEUE:
+            deadline_row += 1
+        arrival_event_time = arrival_time[next_row] if next_row < size else np.inf
+        deadline_event_time = arrival_time[deadline_row] + deadline if deadline_row < next_row else np.inf
+
+        # the earliest event, ties by the Event order: ARRIVAL, SERVICE_COMPLETE / QUANTUM_EXPIRY, DEADLINE_EXPIRY
+        if arrival_event_time <= service_time and arrival_event_time <= deadline_event_time:
+            event_time, event = arrival_event_time, 0
+        elif service_time <= deadline_event_time:
+            event_time, event = service_time, 1
+        else:
+            event_time, event = deadline_event_time, 3
+        if not event_time < simulation_time:
+            break
+
+        elapsed_time = event_time - current_time
+        queue_length_area += queue_size * elapsed_time
+        busy_time += (service_row >= 0) * elapsed_time
+        current_time = event_time
+
+        if event == 0:
+            row = next_row
+            next_row += 1
+            if queue_size < max_queue_size:
+                stored[(head + stored_count) % size if discipline == FIFO else stored_count] = row
+                stored_count += 1
+                queue_size += 1
+            else:
+                finish_state[row] = State.COULD_NOT_GET_INTO_QUEUE
+        elif event == 3:
+            row = deadline_row
+            deadline_row += 1
+            if finish_state[row] == State.PENDING and row != service_row:
+                finish_state[row] = State.STARVED_AT_QUEUE
+                dropped[row] = True
+                queue_size -= 1
+        elif not service_is_quantum:
+            row = service_row
+            service_row, service_time = -1, np.inf
+            processing_time_leftover[row] = 0
+            end_processing_time[row] = current_time
+            if current_time - arrival_time[row] <= deadline:
+                finish_state[row] = State.FINISHED_SUCCESSFULLY
+            else:
+                finish_state[row] = State.FINISHED_AFTER_DEADLINE
+        else:
+            row = service_row
+            service_row, service_time = -1, np.inf
+            processing_time_leftover[row] -= time_quantum
+            if current_time - arrival_time[row] > deadline or queue_size >= max_queue_size:
+                finish_state[row] = State.STARVED_AT_QUEUE
+            else:
+                stored[(head + stored_count) % size if discipline == FIFO else stored_count] = row
+                stored_count += 1
+                queue_size += 1
+
+        # dispatch the next waiting request, if the worker is free
+        while service_row < 0 and queue_size:
+            if discipline == FIFO:
+                row = stored[head]
+                head = (head + 1) % size
+            else:
+                row = stored[stored_count - 1]
+            stored_count -= 1
+            if dropped[row]:
+                dropped[row] = False
+                continue
+            queue_size -= 1
+
+            if np.isnan(start_processing_time[row]):
+                start_processing_time[row] = current_time
+                processing_time_leftover[row] = processing_time[row]
+            leftover = processing_time_leftover[row]
+            if leftover <= time_quantum:
+                service_row, service_time, service_is_quantum = row, current_time + leftover, False
+            else:
+                service_row, service_time, service_is_quantum = row, current_time + time_quantum, True
+
+    elapsed_time = simulation_time - current_time
+    queue_length_area += queue_size * elapsed_time
+    busy_time += (service_row >= 0) * elapsed_time
+
+    # the request in service when the time is up still gets its outcome, as it already started processing
+    if service_row >= 0 and not service_is_quantum:
+        processing_time_leftover[service_row] = 0
+        end_processing_time[service_row] = service_time
+        if service_time - arrival_time[service_row] <= deadline:
+            finish_state[service_row] = State.FINISHED_SUCCESSFULLY
+        else:
+            finish_state[service_row] = State.FINISHED_AFTER_DEADLINE
+    return busy_time, queue_length_area
+
+
+def use_kernel(backend: str, streaming: bool, servers: int) -> bool:
+    """Whether the run goes to the kernels, they cover a single worker keeping the whole table."""
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend!r}, expected one of {BACKENDS}')
+    if backend == 'python' or instrumentation.active() is not None:  # only the engine is instrumented
+        return False
+    if numba is None:
+        logger.warning('Numba is not installed, simulating with the Python engine')
+        return False
+    return not streaming and servers == 1
+
+
+def simulate(
+        discipline: int,
+        max_queue_size: int,
+        request_chunks: Iterator[RequestBatch],
+        simulation_time: float,
+        time_quantum: Optional[float] = None
+) -> RequestTable:
+    """Load all the requests up to the simulation time, as the engine does, and run the kernel over them."""
+    table = RequestTable()
+    for chunk in request_chunks:
+        count = int(np.searchsorted(chunk.arrival_times, simulation_time, 'right'))
+        table.append(RequestBatch(*(column[:count] for column in chunk)))
+        if count < len(chunk.arrival_times):
+            break  # the rest of the requests arrive after the simulation time
+    table.trim()
+
+    busy_time, queue_length_area = _simulate(
+        discipline,
+        max_queue_size,
+        np.inf if time_quantum is None else float(time_quantum),
+        float(table.deadline),
+        float(simulation_time),
+        table.arrival_time,
+        table.processing_time,
+        table.start_processing_time,
+        table.end_processing_time,
+        table.processing_time_leftover,
+        table.finish_state,
+    )
+    table.stats = RunStats(simulation_time, busy_time, queue_length_area)
+    return table
@@ -0,0 +1,180 @@
+"""
+Bounded queues of request rows for the single threaded simulators.
+
+Unlike queue.Queue there are no locks and no exceptions: `push` tells whether the request got in,
+and requests which starved while waiting are dropped lazily (in O(1)) and skipped once they reach the head.
+A queue discipline registers its implementation by name with `register_queue`, and the simulators look their queue
+up by that name - registering another implementation under the name replaces it in the simulator
+(the numba backend kernels keep their own queues).
+"""
+import collections
+import heapq
+from typing import Callable, Dict, List, Optional, Set, Tuple, Type
+
+from src.request_utils import RequestTable
+
+QUEUES: Dict[str, Type['BoundedQueue']] = {}
+
+
+def register_queue(name: str) -> Callable[[Type['BoundedQueue']], Type['BoundedQueue']]:
+    def register(queue_class: Type['BoundedQueue']) -> Type['BoundedQueue']:
+        QUEUES[name] = queue_class
+        return queue_class
+    return register
+
+
+class BoundedQueue:
+    """Base of the queues, subclasses only implement the storage order (`_put`, `_get`, `_shift`)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._size = 0  # rows waiting in the queue, without the dropped ones
+        self._dropped: Set[int] = set()  # rows which are still physically stored, but already left the queue
+
+    def __len__(self) -> int:
+        return self._size
+
+    def attach(self, table: RequestTable) -> None:
+        """Called by the simulator with the table of the rows, for queues which order by the request fields."""
+
+    def full(self) -> bool:
+        return self._size >= self.maxsize
+
+    def push(self, row: int) -> bool:
+        """Insert the row, returns False (and leaves the queue as is) when the queue is full."""
+        if self._size >= self.maxsize:
+            return False
+        self._put(row)
+        self._size += 1
+        return True
+
+    def pop(self) -> Optional[int]:
+        """Remove and return the next row by the queue discipline, None if the queue is empty."""
+        while self._size:
+            row = self._get()
+            if self._dropped and row in self._dropped:
+                self._dropped.discard(row)
+                continue
+            self._size -= 1
+            return row
+        return None
+
+    def drop(self, row: int) -> None:
+        """Remove a waiting row (lazily - it's skipped once it's popped)."""
+        self._dropped.add(row)
+        self._size -= 1
+
+    def renumber(self, count: int) -> None:
+        """Forget the rows below `count` and shift the rest of the rows down by `count`."""
+        self._dropped = {row - count for row in self._dropped if row >= count}
+        self._shift(count)
+
+    def _put(self, row: int) -> None:
+        raise NotImplementedError
+
+    def _get(self) -> int:
+        raise NotImplementedError
+
+    def _shift(self, count: int) -> None:
+        """Renumber the physically stored rows, as in `renumber`."""
+        raise NotImplementedError
+
+
+@register_queue('fifo')
+class FifoQueue(BoundedQueue):
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self._deque = collections.deque()
+        self._put = self._deque.append
+        self._get = self._deque.popleft
+
+    def _shift(self, count: int) -> None:
+        rows = [row - count for row in self._deque if row >= count]
+        self._deque.clear()
+        self._deque.extend(rows)
+
+
+@register_queue('lifo')
+class LifoQueue(BoundedQueue):
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self._stack = []
+        self._put = self._stack.append
+        self._get = self._stack.pop
+
+    def _shift(self, count: int) -> None:
+        self._stack[:] = [row - count for row in self._stack if row >= count]
+
+
+class PriorityQueue(BoundedQueue):
+    """Serves the row with the smallest key first (ties by arrival order)."""
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self._heap: List[Tuple[float, int]] = []
+        self._table: Optional[RequestTable] = None
+
+    def attach(self, table: RequestTable) -> None:
+        self._table = table
+
+    def _key(self, row: int) -> float:
+        raise NotImplementedError
+
+    def _put(self, row: int) -> None:
+        heapq.heappush(self._heap, (self._key(row), row))
+
+    def _get(self) -> int:
+        return heapq.heappop(self._heap)[1]
+
+    def _shift(self, count: int) -> None:
+        # the retired (dropped) rows may be anywhere in the heap, so the rest is heapified again
+        self._heap = [(key, row - count) for key, row in self._heap if row >= count]
+        heapq.heapify(self._heap)
+
+
+@register_queue('edf')
+class EarliestDeadlineQueue(PriorityQueue):
+    def _key(self, row: int) -> float:
+        return float(self._table.arrival_time[row]) + self._table.deadline
+
+
+@register_queue('sjf')
+class ShortestJobQueue(PriorityQueue):
+    def _key(self, row: int) -> float:
+        return float(self._table.processing_time[row])
+
+
+@register_queue('srpt')
+class ShortestRemainingQueue(PriorityQueue):
+    def _key(self, row: int) -> float:
+        leftover = float(self._table.processing_time_leftover[row])
+        return leftover if leftover == leftover else float(self._table.processing_time[row])  # NaN - not started
+
+
+@register_queue('fast_lane')
+class CacheFastLaneQueue(BoundedQueue):
+    """Two FIFO lanes sharing the capacity, the cache hits are served ahead of the disk and recursive lookups."""
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self._fast_lane = collections.deque()
+        self._slow_lane = collections.deque()
+        self._table: Optional[RequestTable] = None
+
+    def attach(self, table: RequestTable) -> None:
+        self._table = table
+
+    def _put(self, row: int) -> None:
+        if self._table.is_in_cache[row]:
+            self._fast_lane.append(row)
+        else:
+            self._slow_lane.append(row)
+
+    def _get(self) -> int:
+        return self._fast_lane.popleft() if self._fast_lane else self._slow_lane.popleft()
+
+    def _shift(self, count: int) -> None:
+        for lane in (self._fast_lane, self._slow_lane):
+            rows = [row - count for row in lane if row >= count]
+            lane.clear()
+            lane.extend(rows)
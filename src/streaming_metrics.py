@@ -0,0 +1,137 @@
+"""
+Online accumulators of the simulation results, for runs which don't keep the requests themselves.
+
+The engine folds every finished request into the accumulators and forgets it,
+so the memory stays constant whatever the simulation time is.
+"""
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.request_utils import RequestTable, State, RunStats
+
+LATENCY_QUANTILES = (0.5, 0.95, 0.99, 0.999)  # the same quantiles the analyzer reports
+# log spaced latency bins, from the fastest cache hit to far beyond the deadline (in milliseconds)
+LATENCY_BIN_EDGES = np.logspace(-3, 6, 271)
+
+
+def histogram_counts(latencies: np.ndarray) -> np.ndarray:
+    """
+    Number of the latencies in each of the LATENCY_BIN_EDGES bins - bin i holds the latencies in
+    (edge i - 1, edge i], the first and the last bins are the under / overflow ones.
+    """
+    return np.bincount(np.searchsorted(LATENCY_BIN_EDGES, latencies), minlength=len(LATENCY_BIN_EDGES) + 1)
+
+
+class P2Quantile:
+    """The P² algorithm (Jain & Chlamtac, 1985), estimates a quantile with 5 markers and no stored samples."""
+
+    def __init__(self, quantile: float):
+        self.quantile = quantile
+        self._heights: List[float] = []  # the first 5 samples, then the marker heights
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired_positions = [0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4]
+        self._increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, sample: float) -> None:
+        heights = self._heights
+        if len(heights) < 5:
+            heights.append(sample)
+            heights.sort()
+            return
+
+        if sample < heights[0]:
+            heights[0] = sample
+            cell = 0
+        elif sample >= heights[4]:
+            heights[4] = sample
+            cell = 3
+        else:
+            cell = 0
+            while sample >= heights[cell + 1]:
+                cell += 1
+
+        positions = self._positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired_positions[i] += self._increments[i]
+
+        for i in (1, 2, 3):  # adjust the middle markers
+            delta = self._desired_positions[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (delta <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        heights, positions = self._heights, self._positions
+        right_slope = (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+        left_slope = (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1])
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) * right_slope
+            + (positions[i + 1] - positions[i] - step) * left_slope
+        )
+
+    def value(self) -> float:
+        if not self._heights:
+            return math.nan
+        if len(self._heights) < 5:
+            return float(np.quantile(self._heights, self.quantile))
+        return self._heights[2]
+
+
+class StreamingMetrics:
+    """Per state counters, a latency histogram and quantile estimators of all the folded requests."""
+
+    def __init__(self):
+        self._state_counts = np.zeros(len(State), dtype=np.int64)
+        self._latency_histogram = np.zeros(len(LATENCY_BIN_EDGES) + 1, dtype=np.int64)  # + under / overflow bins
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_quantiles = {quantile: P2Quantile(quantile) for quantile in LATENCY_QUANTILES}
+        self.wait_quantiles = {quantile: P2Quantile(quantile) for quantile in LATENCY_QUANTILES}
+        self.stats: Optional[RunStats] = None
+
+    def __len__(self) -> int:
+        return int(self._state_counts.sum())
+
+    def state_counts(self) -> np.ndarray:
+        """Number of requests at each State, indexed by the State value."""
+        return self._state_counts.copy()
+
+    def add(self, requests: RequestTable, start: int, stop: int) -> None:
+        """Fold the rows [start, stop) of the table, which won't change anymore."""
+        self._state_counts += np.bincount(requests.finish_state[start:stop], minlength=len(State))
+
+        latencies = requests.end_processing_time[start:stop] - requests.arrival_time[start:stop]
+        latencies = latencies[~np.isnan(latencies)]
+        self._latency_histogram += histogram_counts(latencies)
+        self.latency_count += len(latencies)
+        self.latency_sum += float(latencies.sum())
+        for latency in latencies.tolist():
+            for estimator in self.latency_quantiles.values():
+                estimator.add(latency)
+
+        wait_times = requests.start_processing_time[start:stop] - requests.arrival_time[start:stop]
+        for wait_time in wait_times[~np.isnan(wait_times)].tolist():
+            for estimator in self.wait_quantiles.values():
+                estimator.add(wait_time)
+
+    def latency_histogram(self) -> np.ndarray:
+        """Number of the latencies in each bin, see `histogram_counts`."""
+        return self._latency_histogram.copy()
+
+    def mean_latency(self) -> float:
+        return self.latency_sum / self.latency_count if self.latency_count else math.nan
+
+    def quantiles(self) -> Dict[float, float]:
+        return {quantile: estimator.value() for quantile, estimator in self.latency_quantiles.items()}
+
+    def wait_time_quantiles(self) -> Dict[float, float]:
+        return {quantile: estimator.value() for quantile, estimator in self.wait_quantiles.items()}
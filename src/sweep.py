@@ -0,0 +1,237 @@
+"""
+Parallel executor of the parameters sweep.
+
+Every (queue mechanism, arrival rate, queue size, time quantum, servers, resolver cache size) cell is
+an independent simulation, so the cells are spread across a process pool, each with its own reproducible seed.
+"""
+import functools
+import hashlib
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+from tqdm import tqdm
+
+from src.analyzer import ReplicatedSummary, SimulationResult, mean_confidence_interval, mean_latency, success_percent
+from src.consts import ARRIVAL_RATES, MAX_QUEUE_SIZES, TIME_QUANTUMS, SIMULATION_TIME, DEADLINE
+from src.request_utils import RequestTable, generate_request_chunks
+from src.resolver_cache import ResolverSettings
+from src.result_cache import ResultCache, code_version
+from src.simulators import fifo, lifo, rr, edf, sjf, srpt, fast_lane
+from src.simulators.engine import EventEngine
+from src.streaming_metrics import StreamingMetrics
+from src.trace import read_trace
+
+SIMULATORS = {
+    'FIFO': fifo,
+    'LIFO': lifo,
+    'RoundRobin': rr,
+    'EDF': edf,
+    'SJF': sjf,
+    'SRPT': srpt,
+    'CacheFastLane': fast_lane,
+}
+QUANTUM_MECHANISMS = {'RoundRobin'}  # mechanisms which are swept over TIME_QUANTUMS as well
+KERNEL_MECHANISMS = {'FIFO', 'LIFO', 'RoundRobin'}  # mechanisms which have a `backend` to choose
+
+
+class Cell(NamedTuple):
+    queue_mechanism: str
+    arrival_rate: float
+    max_queue_size: int
+    time_quantum: Optional[int] = None
+    servers: int = 1
+    cache_capacity: Optional[int] = None  # answers the resolver cache holds, None for the fixed cache hit chance
+
+
+def build_cells(
+        queue_mechanisms: Sequence[str] = tuple(SIMULATORS),
+        arrival_rates: Sequence[float] = ARRIVAL_RATES,
+        max_queue_sizes: Sequence[int] = MAX_QUEUE_SIZES,
+        time_quantums: Sequence[int] = TIME_QUANTUMS,
+        servers_counts: Sequence[int] = (1,),
+        cache_capacities: Sequence[Optional[int]] = (None,)
+) -> List[Cell]:
+    cells = []
+    for cache_capacity, servers, queue_mechanism in itertools.product(
+            cache_capacities, servers_counts, queue_mechanisms):
+        quantums = time_quantums if queue_mechanism in QUANTUM_MECHANISMS else [None]
+        for time_quantum, arrival_rate, max_queue_size in itertools.product(quantums, arrival_rates, max_queue_sizes):
+            cells.append(Cell(queue_mechanism, arrival_rate, max_queue_size, time_quantum, servers, cache_capacity))
+    return cells
+
+
+def spawn_seeds(count: int, seed: Optional[int] = None) -> List[int]:
+    """Independent seeds, reproducible given the same parent seed."""
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(count)]
+
+
+def _simulate_cell(
+        cell: Cell,
+        seed: Optional[int],
+        streaming: bool = False,
+        trace: Optional[str] = None,
+        backend: str = 'python',
+        warm_up: float = 0,
+        resolver: ResolverSettings = ResolverSettings(),
+        simulation_time: float = SIMULATION_TIME,
+        checkpoint_dir: Optional[str] = None
+) -> Union[RequestTable, StreamingMetrics]:
+    options = {
+        'simulation_time': simulation_time, 'seed': seed, 'streaming': streaming, 'servers': cell.servers,
+        'warm_up': warm_up,
+    }
+    if checkpoint_dir is not None and seed is not None:
+        # the cell's run is checkpointed at its end, and a later run of the same cell continues it
+        settings = (*cell, DEADLINE, seed, streaming, trace, warm_up, tuple(resolver), code_version())
+        checkpoint = os.path.join(checkpoint_dir, f'{hashlib.sha256(repr(settings).encode()).hexdigest()[:32]}.pkl')
+        if not os.path.exists(checkpoint):
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            options['checkpoint'] = checkpoint
+        else:
+            engine = EventEngine.load(checkpoint)
+            if engine.simulation_time <= simulation_time:
+                engine.extend(simulation_time)
+                return engine.run(checkpoint)
+            # a longer checkpointed run is kept, this shorter one is simulated from the start
+
+    simulator = SIMULATORS[cell.queue_mechanism]
+    if trace is not None:
+        options['request_chunks'] = read_trace(trace)
+    elif cell.cache_capacity is not None:
+        options['request_chunks'] = generate_request_chunks(
+            cell.arrival_rate, seed, cache_model=resolver.model(cell.cache_capacity)
+        )
+    if cell.queue_mechanism in KERNEL_MECHANISMS:
+        options['backend'] = backend
+    if cell.time_quantum is None:
+        return simulator.simulate(cell.max_queue_size, cell.arrival_rate, **options)
+    return simulator.simulate(cell.max_queue_size, cell.arrival_rate, cell.time_quantum, **options)
+
+
+def run_cell(
+        cell: Cell,
+        seed: Optional[int] = None,
+        cache: Optional[ResultCache] = None,
+        streaming: bool = False,
+        trace: Optional[str] = None,
+        backend: str = 'python',
+        warm_up: float = 0,
+        resolver: ResolverSettings = ResolverSettings(),
+        simulation_time: float = SIMULATION_TIME,
+        checkpoint_dir: Optional[str] = None
+) -> Union[RequestTable, StreamingMetrics]:
+    """
+    Simulate the cell for `simulation_time`, with the workload of `trace` if given (its arrival rate is then
+    just a label). The requests which arrive in the first `warm_up` milliseconds are left out of the results.
+    A cell with a cache capacity models its resolver cache with the `resolver` settings.
+    With a `checkpoint_dir` a seeded run is checkpointed there, and a longer run of the cell continues it.
+    """
+    options = {
+        'backend': backend, 'warm_up': warm_up, 'resolver': resolver, 'simulation_time': simulation_time,
+        'checkpoint_dir': checkpoint_dir,
+    }
+    # runs without a seed aren't reproducible, so there's nothing to reuse, and only full tables are cached.
+    # a trace file may change under the same path, so the replays aren't cached either
+    if cache is None or seed is None or streaming or trace is not None:
+        return _simulate_cell(cell, seed, streaming, trace, **options)
+
+    key = (*cell, simulation_time, DEADLINE, seed)  # the backends give identical results, so they share the entries
+    if warm_up:
+        key += (warm_up,)
+    if cell.cache_capacity is not None:
+        key += tuple(resolver)
+    requests = cache.get(key)
+    if requests is None:
+        requests = _simulate_cell(cell, seed, **options)
+        cache.put(key, requests)
+    return requests
+
+
+def run_replicated_cell(
+        cell: Cell,
+        seed: Optional[int] = None,
+        tolerance: float = 1,
+        min_replications: int = 3,
+        max_replications: int = 30,
+        confidence: float = 0.95,
+        cache: Optional[ResultCache] = None,
+        streaming: bool = False,
+        backend: str = 'python',
+        warm_up: float = 0,
+        resolver: ResolverSettings = ResolverSettings(),
+        simulation_time: float = SIMULATION_TIME,
+        checkpoint_dir: Optional[str] = None
+) -> ReplicatedSummary:
+    """
+    Simulate the cell with independent seeds until the confidence interval half width of the success percent
+    is at most `tolerance` (percentage points), so the noisy cells get more replications than the stable ones.
+    """
+    percents, latencies = [], []
+    for replication_seed in spawn_seeds(max_replications, seed):
+        requests = run_cell(
+            cell, replication_seed, cache, streaming, backend=backend, warm_up=warm_up, resolver=resolver,
+            simulation_time=simulation_time, checkpoint_dir=checkpoint_dir,
+        )
+        percents.append(success_percent(requests))
+        latencies.append(mean_latency(requests))
+        if len(percents) >= min_replications and mean_confidence_interval(percents, confidence)[1] <= tolerance:
+            break
+
+    return ReplicatedSummary(
+        len(percents),
+        *mean_confidence_interval(percents, confidence),
+        *mean_confidence_interval(latencies, confidence),
+    )
+
+
+def run_sweep(
+        cells: Sequence[Cell],
+        workers: int = 1,
+        seed: Optional[int] = None,
+        run: Callable[[Cell, Optional[int]], SimulationResult] = run_cell
+) -> Dict[Cell, SimulationResult]:
+    """Simulate all the cells with `run`, using `workers` processes (1 runs in the current process)."""
+    seeds = spawn_seeds(len(cells), seed)
+    if workers <= 1:
+        return {cell: run(cell, cell_seed) for cell, cell_seed in tqdm(list(zip(cells, seeds)))}
+
+    results = {}
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(run, cell, cell_seed): cell for cell, cell_seed in zip(cells, seeds)}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            results[futures[future]] = future.result()
+    # keep the grid order, regardless of the order the cells were done
+    return {cell: results[cell] for cell in cells}
+
+
+def replicated(
+        tolerance: float,
+        max_replications: int,
+        min_replications: int = 3,
+        confidence: float = 0.95,
+        cache: Optional[ResultCache] = None,
+        streaming: bool = False,
+        backend: str = 'python',
+        warm_up: float = 0,
+        resolver: ResolverSettings = ResolverSettings(),
+        simulation_time: float = SIMULATION_TIME,
+        checkpoint_dir: Optional[str] = None
+) -> Callable[[Cell, Optional[int]], ReplicatedSummary]:
+    """A picklable `run` for run_sweep, which replicates every cell."""
+    return functools.partial(
+        run_replicated_cell,
+        tolerance=tolerance,
+        min_replications=min(min_replications, max_replications),
+        max_replications=max_replications,
+        confidence=confidence,
+        cache=cache,
+        streaming=streaming,
+        backend=backend,
+        warm_up=warm_up,
+        resolver=resolver,
+        simulation_time=simulation_time,
+        checkpoint_dir=checkpoint_dir,
+    )
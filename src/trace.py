@@ -0,0 +1,146 @@
+"""
+Replay of recorded resolver query logs, instead of the synthetic workload.
+
+A trace is read lazily in chunks of requests, so any simulator replays it in constant memory. Two formats:
+- JSONL, a query per line: {"timestamp": ms, "outcome": "cache" | "disk" | "recursive", "service_time": ms}
+- columnar, a directory of a .npy file per RequestBatch field, which are memory-mapped (see `convert_jsonl`)
+The timestamps are shifted so the first query of the trace arrives at time 0. The readers are picklable iterators
+(like the synthetic RequestChunks), so a replay can be checkpointed.
+"""
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.request_utils import CHUNK_SIZE, RequestBatch
+
+OUTCOMES = ('cache', 'disk', 'recursive')  # where the query was answered from
+
+
+def _parse_lines(lines: List[bytes], start_time: float) -> RequestBatch:
+    queries = [json.loads(line) for line in lines]
+    outcomes = np.array([OUTCOMES.index(query['outcome']) for query in queries])
+    return RequestBatch(
+        np.array([query['timestamp'] for query in queries], dtype=float) - start_time,
+        np.array([query['service_time'] for query in queries], dtype=float),
+        outcomes == 0,
+        outcomes == 1,
+    )
+
+
+class JsonlChunks:
+    """
+    Iterator of the queries of a JSONL trace in chunks of `chunk_size`.
+    It keeps only the file offset of the next chunk, so it can be pickled to checkpoint a replay.
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._offset = 0
+        self._start_time: Optional[float] = None
+        self._last_arrival_time = -np.inf
+
+    def __iter__(self) -> 'JsonlChunks':
+        return self
+
+    def __next__(self) -> RequestBatch:
+        chunk_lines = []
+        with open(self.path, 'rb') as file:
+            file.seek(self._offset)
+            while len(chunk_lines) < self.chunk_size:
+                line = file.readline()
+                if not line:
+                    break
+                if line.strip():
+                    chunk_lines.append(line)
+            self._offset = file.tell()
+        if not chunk_lines:
+            raise StopIteration
+        if self._start_time is None:
+            self._start_time = float(json.loads(chunk_lines[0])['timestamp'])
+        chunk = _parse_lines(chunk_lines, self._start_time)
+        # the simulators take the requests in arrival order
+        if chunk.arrival_times[0] < self._last_arrival_time or np.any(np.diff(chunk.arrival_times) < 0):
+            raise ValueError(f'The queries of {self.path} are not sorted by their timestamp')
+        self._last_arrival_time = chunk.arrival_times[-1]
+        return chunk
+
+
+def read_jsonl(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[RequestBatch]:
+    """Lazily yield the queries of a JSONL trace in chunks of `chunk_size`."""
+    return JsonlChunks(path, chunk_size)
+
+
+def convert_jsonl(path: str, directory: str, chunk_size: int = CHUNK_SIZE) -> None:
+    """Write a JSONL trace as a columnar trace, in two passes over the file (to count and to copy the queries)."""
+    with open(path) as file:
+        count = sum(1 for line in file if line.strip())
+    os.makedirs(directory, exist_ok=True)
+    columns = {
+        name: np.lib.format.open_memmap(os.path.join(directory, f'{name}.npy'), 'w+', dtype, (count,))
+        for name, dtype in zip(RequestBatch._fields, (float, float, bool, bool))
+    }
+    offset = 0
+    for chunk in read_jsonl(path, chunk_size):
+        for name, values in zip(RequestBatch._fields, chunk):
+            columns[name][offset:offset + len(values)] = values
+        offset += len(chunk.arrival_times)
+    for column in columns.values():
+        column.flush()
+
+
+class ColumnarChunks:
+    """
+    Iterator of the queries of a columnar trace in chunks of `chunk_size`, only the read pages are loaded.
+    It keeps only the offset of the next chunk, so it can be pickled to checkpoint a replay.
+    """
+
+    def __init__(self, directory: str, chunk_size: int = CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self._offset = 0
+        self._columns: Optional[List[np.ndarray]] = None  # memory-mapped on the first chunk
+
+    def __iter__(self) -> 'ColumnarChunks':
+        return self
+
+    def __next__(self) -> RequestBatch:
+        if self._columns is None:
+            self._columns = [
+                np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r') for name in RequestBatch._fields
+            ]
+        offset = self._offset
+        if offset >= len(self._columns[0]):
+            raise StopIteration
+        self._offset += self.chunk_size
+        return RequestBatch(*(column[offset:offset + self.chunk_size] for column in self._columns))
+
+    def __getstate__(self) -> Dict:
+        return {**self.__dict__, '_columns': None}  # the maps are opened again on the next chunk
+
+
+def read_columnar(directory: str, chunk_size: int = CHUNK_SIZE) -> Iterator[RequestBatch]:
+    """Lazily yield the queries of a columnar trace in chunks of `chunk_size`, only the read pages are loaded."""
+    return ColumnarChunks(directory, chunk_size)
+
+
+def read_trace(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[RequestBatch]:
+    """The request chunks of a trace, of either format (a directory is a columnar trace)."""
+    if os.path.isdir(path):
+        return read_columnar(path, chunk_size)
+    return read_jsonl(path, chunk_size)
+
+
+def mean_arrival_rate(path: str) -> float:
+    """Queries per millisecond over the whole trace."""
+    if os.path.isdir(path):
+        arrival_times = np.load(os.path.join(path, 'arrival_times.npy'), mmap_mode='r')
+        count, last_arrival_time = len(arrival_times), float(arrival_times[-1]) if len(arrival_times) else 0.0
+    else:
+        count, last_arrival_time = 0, 0.0
+        for chunk in read_jsonl(path):
+            count += len(chunk.arrival_times)
+            last_arrival_time = float(chunk.arrival_times[-1])
+    return (count - 1) / last_arrival_time if last_arrival_time > 0 else np.nan
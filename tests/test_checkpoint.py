@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from src.analyzer import summarize
+from src.simulators import edf, fifo, rr, srpt
+from src.simulators.engine import resume
+
+
+def _simulate(simulator, simulation_time, **options):
+    if simulator is rr:
+        return simulator.simulate(50, 1.5, 5, simulation_time, seed=2, **options)
+    return simulator.simulate(50, 1.5, simulation_time, seed=2, **options)
+
+
+@pytest.mark.parametrize('simulator', [fifo, rr, edf, srpt])
+@pytest.mark.parametrize('servers', [1, 3])
+@pytest.mark.parametrize('warm_up', [0, 1000])
+def test_resumed_run_equals_an_uninterrupted_one(tmp_path, simulator, servers, warm_up):
+    checkpoint = str(tmp_path / 'run.pkl')
+    _simulate(simulator, 5000, servers=servers, warm_up=warm_up, checkpoint=checkpoint)
+    resume(checkpoint, 10_000, checkpoint)
+    resumed = resume(checkpoint, 20_000)
+    uninterrupted = _simulate(simulator, 20_000, servers=servers, warm_up=warm_up)
+
+    assert resumed.stats == uninterrupted.stats
+    for name, column in uninterrupted.columns().items():
+        np.testing.assert_array_equal(resumed.columns()[name], column, err_msg=name)
+
+
+@pytest.mark.parametrize('simulator', [fifo, srpt])
+def test_resumed_streaming_run_equals_an_uninterrupted_one(tmp_path, simulator):
+    checkpoint = str(tmp_path / 'run.pkl')
+    _simulate(simulator, 5000, servers=2, streaming=True, checkpoint=checkpoint)
+    resumed = resume(checkpoint, 20_000)
+    uninterrupted = _simulate(simulator, 20_000, servers=2, streaming=True)
+
+    assert resumed.stats == uninterrupted.stats
+    np.testing.assert_array_equal(resumed.state_counts(), uninterrupted.state_counts())
+    assert summarize(resumed) == pytest.approx(summarize(uninterrupted), nan_ok=True)
+
+
+def test_resume_rejects_an_earlier_simulation_time(tmp_path):
+    checkpoint = str(tmp_path / 'run.pkl')
+    _simulate(fifo, 5000, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        resume(checkpoint, 2000)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from src.simulators import fifo, lifo, rr
+
+pytest.importorskip('numba')
+
+SIMULATION_TIME = 5000
+
+
+def _simulate(simulator, max_queue_size, arrival_rate, backend, time_quantum=None):
+    if time_quantum is None:
+        return simulator.simulate(max_queue_size, arrival_rate, SIMULATION_TIME, seed=3, backend=backend)
+    return simulator.simulate(max_queue_size, arrival_rate, time_quantum, SIMULATION_TIME, seed=3, backend=backend)
+
+
+@pytest.mark.parametrize('simulator, time_quantum', [(fifo, None), (lifo, None), (rr, 2), (rr, 20)])
+@pytest.mark.parametrize('arrival_rate', [0.01, 0.5, 3])
+@pytest.mark.parametrize('max_queue_size', [10, 1000])
+def test_kernel_is_bit_identical_to_the_engine(simulator, time_quantum, arrival_rate, max_queue_size):
+    reference = _simulate(simulator, max_queue_size, arrival_rate, 'python', time_quantum)
+    kernel = _simulate(simulator, max_queue_size, arrival_rate, 'numba', time_quantum)
+
+    assert kernel.stats == reference.stats
+    for name, column in reference.columns().items():
+        np.testing.assert_array_equal(kernel.columns()[name], column, err_msg=name)
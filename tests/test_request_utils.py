@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from src.request_utils import RequestBatch, generate_new_request, generate_request_chunks, generate_requests_batch
+
+
+def _concatenated_chunks(arrival_rate, seed, chunk_size, horizon):
+    chunks = []
+    for chunk in generate_request_chunks(arrival_rate, seed, chunk_size):
+        chunks.append(chunk)
+        if chunk.arrival_times[-1] > horizon:
+            break
+    batch = RequestBatch(*(np.concatenate(column) for column in zip(*chunks)))
+    count = np.searchsorted(batch.arrival_times, horizon, side='right')
+    return RequestBatch(*(column[:count] for column in batch))
+
+
+@pytest.mark.parametrize('arrival_rate', [0.01, 1, 50])
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_batch_and_chunks_draw_the_same_workload(arrival_rate, chunk_size):
+    horizon = 2000
+    batch = generate_requests_batch(arrival_rate, horizon, seed=11)
+    chunks = _concatenated_chunks(arrival_rate, 11, chunk_size, horizon)
+
+    for field, column in zip(RequestBatch._fields, batch):
+        np.testing.assert_array_equal(getattr(chunks, field), column, err_msg=field)
+
+
+def test_one_by_one_draws_the_same_workload():
+    batch = generate_requests_batch(2, 1000, seed=5)
+    requests = generate_new_request(2, seed=5)
+    one_by_one = [next(requests) for _ in range(len(batch.arrival_times))]
+
+    assert one_by_one == list(zip(batch.arrival_times.tolist(), batch.processing_times.tolist()))